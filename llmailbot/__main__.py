@@ -3,14 +3,15 @@ import os
 import re
 import sys
 
-import aiorun
 import click
 from loguru import logger
 
-from llmailbot.config import FetchConfig, ReplyConfig, SendConfig
-from llmailbot.core import AppComponent, run_app
+from llmailbot.enums import AppComponent
 from llmailbot.logging import LogLevel, setup_logging
 
+# Heavier imports (pydantic models, imap_tools, langchain, aiorun) are deferred
+# to the commands that need them, so --help and config commands start quickly.
+
 RE_API_KEY_FILE = re.compile(r"^(?P<name>[A-Z0-9a-z]+_API_KEY)_FILE$")
 
 
@@ -31,6 +32,8 @@ def cli(config_file: str | None, log_level: str, log_file: str | None):
     setup_logging(log_file, log_level)
     load_api_key_files()
     if config_file:
+        from llmailbot.config import FetchConfig, ReplyConfig, SendConfig
+
         FetchConfig.model_config["yaml_file"] = config_file
         ReplyConfig.model_config["yaml_file"] = config_file
         SendConfig.model_config["yaml_file"] = config_file
@@ -51,21 +54,23 @@ def show(components: list[AppComponent]):
     """
     Print loaded configuration in YAML format.
     """
+    from llmailbot.config import FetchConfig, ReplyConfig, SendConfig, load_config
+
     if not components:
         components = list(AppComponent)
 
     if AppComponent.FETCH in components:
-        fetch_conf = FetchConfig()
+        fetch_conf = load_config(FetchConfig)
         click.echo("Fetch configuration:")
         click.echo(indent(fetch_conf.dump_yaml()))
 
     if AppComponent.REPLY in components:
-        reply_conf = ReplyConfig()
+        reply_conf = load_config(ReplyConfig)
         click.echo("Reply configuration:")
         click.echo(indent(reply_conf.dump_yaml()))
 
     if AppComponent.SEND in components:
-        send_conf = SendConfig()
+        send_conf = load_config(SendConfig)
         click.echo("Send configuration:")
         click.echo(indent(send_conf.dump_yaml()))
 
@@ -280,6 +285,9 @@ def run(components: list[AppComponent], threads: int):
 
     Specify components to run only those.
     """
+    import aiorun
+
+    from llmailbot.core import run_app
 
     aiorun.run(
         run_app(components=components),
@@ -1,25 +1,30 @@
 from __future__ import annotations
 
+import copy
 import datetime
 import re
+from collections import OrderedDict
+from functools import lru_cache
 from pathlib import Path
 from typing import Annotated, Any, List, Literal, TypeVar
 
 import yaml
 from annotated_types import Ge, Le
-from config_path import ConfigPath
+from loguru import logger
 from pydantic import (
+    AfterValidator,
     ConfigDict,
-    EmailStr,
     Field,
     NonNegativeInt,
     PositiveFloat,
     PositiveInt,
     SecretStr,
+    ValidationInfo,
+    field_validator,
     model_validator,
 )
 from pydantic_settings import BaseSettings, SettingsConfigDict, YamlConfigSettingsSource
-from pydantic_settings.sources import PydanticBaseSettingsSource
+from pydantic_settings.sources import PydanticBaseSettingsSource, SecretsSettingsSource
 
 from llmailbot.duration import parse_duration
 from llmailbot.enums import (
@@ -42,25 +47,98 @@ Port = Annotated[int, Ge(1), Le(65535)]
 Temperature = Annotated[float, Ge(0.0), Le(1.0)]
 
 
+RE_EMAIL_ADDRESS = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+
+def validate_email_address(addr: str) -> str:
+    # A basic shape check is enough for addresses in our own config; unlike EmailStr,
+    # it doesn't need email-validator, which is slow to import and to run.
+    if not RE_EMAIL_ADDRESS.match(addr):
+        raise ValueError(f"invalid email address: {addr}")
+    # Domains are case-insensitive, normalize them like EmailStr does
+    local_part, _, domain = addr.rpartition("@")
+    return f"{local_part}@{domain.lower()}"
+
+
+EmailAddress = Annotated[str, AfterValidator(validate_email_address)]
+
+
+RE_UPPERCASE_BOUNDARY = re.compile(r"(?<!^)(?=[A-Z])")
+
+
+# Both are cached: they are called for the same small set of field names over and over
+@lru_cache(maxsize=512)
 def snake_to_camel_case(snake_str: str) -> str:
     return "".join(word.title() for word in snake_str.split("_"))
 
 
+@lru_cache(maxsize=512)
 def camel_to_snake_case(camel_str: str) -> str:
     # Insert underscore before uppercase letters and convert to lowercase
-    snake_str = re.sub(r"(?<!^)(?=[A-Z])", "_", camel_str).lower()
+    snake_str = RE_UPPERCASE_BOUNDARY.sub("_", camel_str).lower()
     return snake_str
 
 
-def yaml_config_locations() -> List[Path]:
+# These are resolved lazily (when settings are first loaded) rather than at import time,
+# then cached, since they look up the home directory and stat the filesystem.
+@lru_cache(maxsize=1)
+def yaml_config_locations() -> tuple[Path, ...]:
+    from config_path import ConfigPath
+
     unix_common = Path.home() / ".config" / "llmailbot" / "config.yaml"
     os_convention = ConfigPath("llmailbot", "pigeonland.net", ".yaml").saveFilePath(mkdir=False)
-    return [Path("./config.yaml"), unix_common, Path(os_convention)]
+    return (Path("./config.yaml"), unix_common, Path(os_convention))
 
 
-def secrets_dirs():
+@lru_cache(maxsize=1)
+def secrets_dirs() -> tuple[Path, ...]:
     paths = [Path("/run/secrets"), Path("/var/run/llmailbot/secrets")]
-    return [p for p in paths if p.exists()]
+    return tuple(p for p in paths if p.exists())
+
+
+try:
+    from yaml import CSafeDumper as YamlSafeDumper
+    from yaml import CSafeLoader as YamlSafeLoader
+except ImportError:
+    from yaml import SafeDumper as YamlSafeDumper
+    from yaml import SafeLoader as YamlSafeLoader
+
+    logger.debug("libyaml is not available; falling back to the pure Python YAML loader and dumper")
+
+
+YAML_CACHE_SIZE = 16
+
+_yaml_cache: OrderedDict[Path, tuple[int, int, dict[str, Any]]] = OrderedDict()
+
+
+def load_yaml_file(path: Path, encoding: str | None = None) -> dict[str, Any]:
+    """
+    Load a YAML config file.
+
+    Parsed files are cached by path and reused as long as their mtime and size
+    are unchanged, so that settings classes loading the same file don't each
+    re-parse it.
+    """
+    path = path.resolve()
+    stat = path.stat()
+    cached = _yaml_cache.get(path)
+    if cached is not None and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+        _yaml_cache.move_to_end(path)
+        return copy.deepcopy(cached[2])
+
+    with path.open(encoding=encoding) as f:
+        data = yaml.load(f, Loader=YamlSafeLoader) or {}
+
+    _yaml_cache[path] = (stat.st_mtime_ns, stat.st_size, data)
+    _yaml_cache.move_to_end(path)
+    while len(_yaml_cache) > YAML_CACHE_SIZE:
+        _yaml_cache.popitem(last=False)
+    return copy.deepcopy(data)
+
+
+class CachedYamlConfigSettingsSource(YamlConfigSettingsSource):
+    def _read_file(self, file_path: Path) -> dict[str, Any]:
+        return load_yaml_file(file_path, self.yaml_file_encoding)
 
 
 class RootSettings(BaseSettings):
@@ -68,8 +146,6 @@ class RootSettings(BaseSettings):
         alias_generator=snake_to_camel_case,
         case_sensitive=False,
         extra="ignore",
-        secrets_dir=secrets_dirs(),
-        yaml_file=yaml_config_locations(),
         populate_by_name=True,
     )
 
@@ -82,21 +158,28 @@ class RootSettings(BaseSettings):
         dotenv_settings: PydanticBaseSettingsSource,
         file_secret_settings: PydanticBaseSettingsSource,
     ) -> tuple[PydanticBaseSettingsSource, ...]:
-        if cls.model_config.get("yaml_file"):
-            yaml_settings = YamlConfigSettingsSource(settings_cls)
-            return init_settings, yaml_settings, file_secret_settings
-        else:
-            return init_settings, file_secret_settings
+        # yaml_file and secrets_dir can be set explicitly in model_config (e.g. with --config),
+        # otherwise the default locations are used
+        if cls.model_config.get("secrets_dir") is None:
+            file_secret_settings = SecretsSettingsSource(settings_cls, secrets_dir=secrets_dirs())
+        yaml_file = cls.model_config.get("yaml_file") or yaml_config_locations()
+        yaml_settings = CachedYamlConfigSettingsSource(settings_cls, yaml_file=yaml_file)
+        return init_settings, yaml_settings, file_secret_settings
 
     def dump_yaml(self) -> str:
-        return yaml.dump(self.model_dump(mode="json", by_alias=True), sort_keys=False)
+        # mode="json" is still needed, to mask secrets and turn enums into plain strings
+        return yaml.dump(
+            self.model_dump(mode="json", by_alias=True), Dumper=YamlSafeDumper, sort_keys=False
+        )
 
 
 class SubSettings(BaseSettings):
+    # Sub-configs are read-only once validated; validators must not assign fields
     model_config = SettingsConfigDict(
         alias_generator=snake_to_camel_case,
         case_sensitive=False,
         extra="ignore",
+        frozen=True,
         populate_by_name=True,
     )
 
@@ -118,20 +201,26 @@ class SMTPConfig(SubSettings):
     password: SecretStr = Field(...)
     server: str = Field(...)
     port: Port = Field(465)
-    encryption: Opt[EncryptionMode] = Field(None)
+    encryption: Opt[EncryptionMode] = Field(None, validate_default=True)
+    send_batch_size: Annotated[PositiveInt, Field()] = 32
 
-    @model_validator(mode="after")
-    def validate_encryption(self) -> SMTPConfig:
-        if self.encryption is None:
+    @field_validator("encryption", mode="after")
+    @classmethod
+    def validate_encryption(
+        cls, v: Opt[EncryptionMode], info: ValidationInfo
+    ) -> Opt[EncryptionMode]:
+        # port is declared before encryption, so it is already validated (unless invalid)
+        if v is None and "port" in info.data:
+            port = info.data["port"]
             try:
-                self.encryption = DEFAULT_SMTP_ENCRYPTION[self.port]
+                return DEFAULT_SMTP_ENCRYPTION[port]
             except KeyError as e:
                 raise ConfigError(
-                    f"Cannot infer encryption mode for non-standard SMTP port {self.port}. "
+                    f"Cannot infer encryption mode for non-standard SMTP port {port}. "
                     f"Please specify 'Encryption' explicitly."
                 ) from e
 
-        return self
+        return v
 
 
 class IMAPConfig(SubSettings):
@@ -140,26 +229,33 @@ class IMAPConfig(SubSettings):
     password: SecretStr = Field(...)
     server: str = Field(...)
     port: Port = Field(993)
-    encryption: Annotated[Opt[EncryptionMode], Field()] = None
+    encryption: Annotated[Opt[EncryptionMode], Field(validate_default=True)] = None
 
     watch_folder: Annotated[str, Field()] = "INBOX"
     replied_folder: Annotated[str | None, Field()] = "LLMailBot/Processed"
     blocked_folder: Annotated[str | None, Field()] = "LLMailBot/Blocked"
     max_fetch_rate: Annotated[PositiveFloat, Field()] = 1.0
-    idle_timeout: Annotated[PositiveInt, Field()] = 30
+    fetch_batch_size: Annotated[PositiveInt, Field()] = 100
+    # RFC 2177: clients should re-issue IDLE at least every 29 minutes
+    idle_timeout: Annotated[PositiveInt, Le(29 * 60), Field()] = 30
 
-    @model_validator(mode="after")
-    def validate_encryption(self) -> IMAPConfig:
-        if self.encryption is None:
+    @field_validator("encryption", mode="after")
+    @classmethod
+    def validate_encryption(
+        cls, v: Opt[EncryptionMode], info: ValidationInfo
+    ) -> Opt[EncryptionMode]:
+        # port is declared before encryption, so it is already validated (unless invalid)
+        if v is None and "port" in info.data:
+            port = info.data["port"]
             try:
-                self.encryption = DEFAULT_IMAP_ENCRYPTION[self.port]
+                return DEFAULT_IMAP_ENCRYPTION[port]
             except KeyError as e:
                 raise ConfigError(
-                    f"Cannot infer encryption mode for non-standard IMAP port {self.port}. "
+                    f"Cannot infer encryption mode for non-standard IMAP port {port}. "
                     f"Please specify 'Encryption' explicitly."
                 ) from e
 
-        return self
+        return v
 
 
 class RedisConfig(SubSettings):
@@ -180,7 +276,9 @@ class QueueSettings(RedisConfig):
     queue_type: Annotated[QueueType, Field(alias="Type")] = QueueType.MEMORY
     key: Annotated[Opt[str], Field()] = None
     timeout: Annotated[NonNegativeInt, Field()] = 10
-    max_size: Annotated[NonNegativeInt, Field()] = 0
+    # Bounded by default, so that fetching can't outrun replying without limit
+    # (0 means unbounded)
+    max_size: Annotated[NonNegativeInt, Field()] = 1000
 
     @model_validator(mode="after")
     def validate_key_if_redis(self) -> QueueSettings:
@@ -216,11 +314,11 @@ class SecurityConfig(SubSettings):
     rate_limit_per_domain: Annotated[Opt[RateLimitConfig], Field()] = None
 
     # Secure default: dont allow any addresses
-    allow_from: List[EmailStr] = Field(default_factory=list)
+    allow_from: List[EmailAddress] = Field(default_factory=list)
     allow_from_all_i_want_to_spend_it_all: Annotated[
         bool, Field(alias="AllowAllAddressesIReallyDontMindSpendingAllMyCredits")
     ] = False
-    block_from: Annotated[Opt[List[EmailStr]], Field()] = None
+    block_from: Annotated[Opt[List[EmailAddress]], Field()] = None
 
     filter_headers: Annotated[Opt[List[FilterHeaderConfig]], Field()] = None
 
@@ -236,9 +334,17 @@ class ChatModelConfig(SubSettings):
     max_tokens: PositiveInt = 1024
     temperature: Temperature = 0.2
 
-    def chat_model_config(self) -> dict[str, Any]:
+    _chat_model_config: dict[str, Any]
+
+    @model_validator(mode="after")
+    def build_chat_model_config(self) -> ChatModelConfig:
+        # The model is frozen, so the snake_case config only needs to be built once
         config = self.model_dump()
-        return {camel_to_snake_case(k): v for k, v in config.items()}
+        self._chat_model_config = {camel_to_snake_case(k): v for k, v in config.items()}
+        return self
+
+    def chat_model_config(self) -> dict[str, Any]:
+        return self._chat_model_config.copy()
 
 
 DEFAULT_SYSTEM_PROMPT = """
@@ -255,7 +361,7 @@ Reply to this email conversation:
 class ModelSpec(SubSettings):
     name: str = Field(...)
 
-    address: Annotated[Opt[EmailStr], Field()] = None
+    address: Annotated[Opt[EmailAddress], Field()] = None
     address_regex: Annotated[Opt[str], Field()] = None
 
     max_input_length: Annotated[PositiveInt, Field()] = 5000
@@ -291,15 +397,17 @@ class ModelSpec(SubSettings):
         model_config = self.params.chat_model_config()
         if email_addr and self._address_regex:
             if m := self._address_regex.match(email_addr):
-                for k, v in m.groupdict().items():
-                    if v is not None:
-                        model_config[k.lower()] = v
+                model_config.update(
+                    {k.lower(): v for k, v in m.groupdict().items() if v is not None}
+                )
 
         return model_config
 
 
 def default_queue() -> QueueSettings:
-    return QueueSettings()
+    # The defaults are known to be valid, so skip validation (and settings sources,
+    # which would otherwise read e.g. HOST or PORT from the environment)
+    return QueueSettings.model_construct()
 
 
 class FetchConfig(RootSettings):
@@ -315,21 +423,38 @@ class SendConfig(RootSettings):
 
 class ReplyConfig(RootSettings):
     models: List[ModelSpec] = Field(...)
-    chat_model_configurable_fields: Opt[set[str]] = Field(None)
+    chat_model_configurable_fields: Opt[frozenset[str]] = Field(None)
+    max_concurrent_replies: Annotated[PositiveInt, Field()] = 8
     receive_queue: QueueSettings = Field(default_factory=default_queue)
     send_queue: QueueSettings = Field(default_factory=default_queue)
 
-    @model_validator(mode="after")
-    def normalize_chat_model_configurable_fields(self) -> ReplyConfig:
-        if self.chat_model_configurable_fields is not None:
-            self.chat_model_configurable_fields = set(
-                [camel_to_snake_case(f) for f in self.chat_model_configurable_fields]
-            )
-        return self
+    @field_validator("chat_model_configurable_fields", mode="after")
+    @classmethod
+    def normalize_chat_model_configurable_fields(
+        cls, v: Opt[frozenset[str]]
+    ) -> Opt[frozenset[str]]:
+        if v is not None:
+            return frozenset(map(camel_to_snake_case, v))
+        return v
 
     @model_validator(mode="after")
     def validate_unique_bot_addresses(self) -> ReplyConfig:
-        addresses = [bot.address for bot in self.models]
-        if len(addresses) != len(set(addresses)):
-            raise ConfigError("Each mailbot must use a unique email address")
+        seen: set[str] = set()
+        for bot in self.models:
+            # Bots matched by AddressRegex have no fixed address
+            if bot.address is None:
+                continue
+            if bot.address in seen:
+                raise ConfigError("Each mailbot must use a unique email address")
+            seen.add(bot.address)
         return self
+
+
+@lru_cache(maxsize=None)
+def load_config[C: RootSettings](config_cls: type[C]) -> C:
+    """
+    Load and validate a root config class, once per process.
+
+    Sub-configs are frozen, so the returned config can be shared by all components.
+    """
+    return config_cls()  # pyright: ignore[reportCallIssue]
@@ -1,24 +1,24 @@
 import asyncio
-from enum import StrEnum
-from typing import Awaitable, Iterable
+from typing import Iterable
 
 from loguru import logger
 
-from llmailbot.config import ConfigError, FetchConfig, QueueSettings, ReplyConfig, SendConfig
+from llmailbot.config import (
+    ConfigError,
+    FetchConfig,
+    QueueSettings,
+    ReplyConfig,
+    SendConfig,
+    load_config,
+)
 from llmailbot.email.fetch import make_mail_fetch_task
 from llmailbot.email.model import IMAPRawMessage, SimpleEmailMessage
 from llmailbot.email.send import make_mail_send_task
+from llmailbot.enums import AppComponent
 from llmailbot.mailbot import make_bot_reply_spawn_task
 from llmailbot.queue import make_queue
 from llmailbot.queue.core import AsyncQueue
 
-
-class AppComponent(StrEnum):
-    FETCH = "fetch"
-    REPLY = "reply"
-    SEND = "send"
-
-
 _mail_recv_q: AsyncQueue[IMAPRawMessage] | None = None
 
 
@@ -50,48 +50,57 @@ async def run_app(components: Iterable[AppComponent] | None = None):
         components = list(AppComponent)
     components = set(components)
 
-    tasks: list[Awaitable[None]] = []
-
+    # Load all configs before starting anything, so config errors don't leave tasks running
+    fetch_conf: FetchConfig | None = None
+    reply_conf: ReplyConfig | None = None
+    send_conf: SendConfig | None = None
     if AppComponent.FETCH in components:
-        fetch_conf = FetchConfig()  # pyright: ignore[reportCallIssue]
-        tasks.append(
-            make_mail_fetch_task(
-                fetch_conf.imap,
-                fetch_conf.security,
-                get_mail_recv_q(fetch_conf.receive_queue),
-            )
-            .runner()
-            .start(interval=1.0 / fetch_conf.imap.max_fetch_rate)
-            .result()
-        )
-
+        fetch_conf = load_config(FetchConfig)
     if AppComponent.REPLY in components:
-        reply_conf = ReplyConfig()  # pyright: ignore[reportCallIssue]
+        reply_conf = load_config(ReplyConfig)
         if not reply_conf.models:
             raise ConfigError("No LLM model configured")
-
-        tasks.append(
-            make_bot_reply_spawn_task(
-                reply_conf,
-                get_mail_recv_q(reply_conf.receive_queue),
-                get_mail_send_q(reply_conf.send_queue),
-            )
-            .runner()
-            .start()
-            .result()
-        )
-
     if AppComponent.SEND in components:
-        send_conf = SendConfig()  # pyright: ignore[reportCallIssue]
-        tasks.append(
-            make_mail_send_task(
-                send_conf.smtp,
-                get_mail_send_q(send_conf.send_queue),
-            )
-            .runner()
-            .start()
-            .result(),
-        )
-
-    logger.success("All tasks started")
-    await asyncio.gather(*tasks)
+        send_conf = load_config(SendConfig)
+
+    # If any task fails, the TaskGroup cancels the others
+    try:
+        async with asyncio.TaskGroup() as tg:
+            if fetch_conf is not None:
+                tg.create_task(
+                    make_mail_fetch_task(
+                        fetch_conf.imap,
+                        fetch_conf.security,
+                        get_mail_recv_q(fetch_conf.receive_queue),
+                    )
+                    .runner()
+                    .start(interval=1.0 / fetch_conf.imap.max_fetch_rate)
+                    .result()
+                )
+
+            if reply_conf is not None:
+                tg.create_task(
+                    make_bot_reply_spawn_task(
+                        reply_conf,
+                        get_mail_recv_q(reply_conf.receive_queue),
+                        get_mail_send_q(reply_conf.send_queue),
+                    )
+                    .runner()
+                    .start()
+                    .result()
+                )
+
+            if send_conf is not None:
+                tg.create_task(
+                    make_mail_send_task(
+                        send_conf.smtp,
+                        get_mail_send_q(send_conf.send_queue),
+                    )
+                    .runner()
+                    .start()
+                    .result()
+                )
+
+            logger.success("All tasks started")
+    finally:
+        await logger.complete()
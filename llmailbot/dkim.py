@@ -63,7 +63,7 @@ class VerificationResult(Enum):
 
 
 def verify_dkim_signatures(email: IMAPMessage, timeout: int = 5) -> VerificationResult:
-    sigs = email.obj.get_all("DKIM-Signature")
+    sigs = email.get_all_headers("DKIM-Signature")
     if not sigs:
         return VerificationResult.MISSING
     sig_indices = list(range(len(sigs)))
@@ -1,4 +1,8 @@
 import asyncio
+import imaplib
+import threading
+import time
+from collections import OrderedDict
 from ssl import SSLContext
 from typing import Any, Awaitable, Callable, cast, override
 
@@ -8,6 +12,8 @@ from loguru import logger
 
 from llmailbot.config import EncryptionMode, IMAPConfig, SecurityConfig
 from llmailbot.email.model import IMAPRawMessage
+from llmailbot.email.tls import default_ssl_context
+from llmailbot.logging import LogLevel
 from llmailbot.queue.core import (
     AsyncQueue,
     SyncQueue,
@@ -33,8 +39,8 @@ def connect_mailbox(
         "port": config.port,
         "timeout": timeout,
     }
-    if ssl_context is not None and config.encryption != EncryptionMode.NONE:
-        kwargs["ssl_context"] = ssl_context
+    if config.encryption != EncryptionMode.NONE:
+        kwargs["ssl_context"] = ssl_context or default_ssl_context()
 
     if config.encryption is None:
         raise ValueError("Encryption mode cannot be None")
@@ -47,15 +53,34 @@ def connect_mailbox(
     return mailbox
 
 
+# Errors after which the IMAP connection is assumed to be broken (OSError includes
+# socket timeouts and SSL errors)
+IMAP_CONNECTION_ERRORS = (imaplib.IMAP4.abort, OSError)
+
+# How often an ongoing IDLE checks whether it should be interrupted, in seconds
+IDLE_POLL_INTERVAL = 1.0
+
+
 class MailboxWatcher(AsyncTask):
     """
     Long-lived watcher for an IMAP mailbox folder.
+
+    The same IMAP connection is kept open and reused for every run. If the connection
+    is lost, it is re-established on the next run, up to MAX_RECONNECT_ATTEMPTS
+    consecutive times, with an exponential backoff between attempts.
+
+    When the folder is empty, the watcher waits in IMAP IDLE (if the server supports
+    it) for up to idle_timeout seconds, so new mail is picked up as soon as the server
+    announces it, instead of at the next poll.
     """
 
+    MAX_RECONNECT_ATTEMPTS = 5
+    MAX_RECONNECT_DELAY = 60
+
     def __init__(
         self,
         config: IMAPConfig,
-        callback: Callable[[BaseMailBox, IMAPRawMessage], Awaitable[Any]],
+        callback: Callable[[BaseMailBox, list[IMAPRawMessage]], Awaitable[Any]],
         ssl_context: SSLContext | None = None,
         timeout: int | None = None,
     ):
@@ -67,54 +92,107 @@ class MailboxWatcher(AsyncTask):
         self.move_to_folder = None
         self.blocked_folder = None
         self.mb = connect_mailbox(self.config, self.ssl_context, self.timeout)
+        self.connected = True
+        self.reconnect_attempts = 0
         self.setup_folders()
         self.callback = callback
         self.uids = []
 
-    async def fetch_next_uid(self) -> IMAPRawMessage | None:
-        next_uid = self.uids.pop()
-        logger.trace("Fetching message with UID {}", next_uid)
-        messages_iter = await asyncio.to_thread(self.mb.fetch, AND(uid=next_uid))
-        messages = cast(list[IMAPRawMessage], list(messages_iter))
-        if not messages:
-            logger.warning("Failed to fetch message with UID {}", next_uid)
-            return
-        if len(messages) > 1:
-            logger.warning("Multiple messages found with UID {}", next_uid)
-        message = messages[0]
-        message.uid = next_uid
-        return message
+    def reconnect(self):
+        try:
+            self.mb.logout()
+        except Exception:
+            pass
+        logger.info("Reconnecting to IMAP server {}", self.config.server)
+        self.mb = connect_mailbox(self.config, self.ssl_context, self.timeout)
+        self.connected = True
+        self.reconnect_attempts = 0
+
+    @property
+    def supports_idle(self) -> bool:
+        return "IDLE" in self.mb.client.capabilities
+
+    def _idle(self, timeout: float, interrupt: threading.Event) -> list[bytes]:
+        """
+        Blocking IDLE until the server sends a response, timeout expires, or
+        interrupt is set. IDLE is always ended with DONE before returning.
+        """
+        deadline = time.monotonic() + timeout
+        responses: list[bytes] = []
+        with self.mb.idle as idle:
+            while not responses and not interrupt.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                responses = idle.poll(timeout=min(remaining, IDLE_POLL_INTERVAL))
+        return responses
+
+    async def idle(self) -> list[bytes]:
+        interrupt = threading.Event()
+        idle_fut = asyncio.ensure_future(
+            asyncio.to_thread(self._idle, self.config.idle_timeout, interrupt)
+        )
+        try:
+            return await asyncio.shield(idle_fut)
+        except asyncio.CancelledError:
+            # The connection can't be used (or logged out) until IDLE is ended, which
+            # takes at most IDLE_POLL_INTERVAL once interrupted
+            interrupt.set()
+            await asyncio.wait((idle_fut,))
+            raise
+
+    def _fetch(self, uids: list[str]) -> list[IMAPRawMessage]:
+        messages_iter = self.mb.fetch(AND(uid=uids), bulk=True)
+        return cast(list[IMAPRawMessage], list(messages_iter))
+
+    async def fetch_next_batch(self) -> list[IMAPRawMessage]:
+        batch_size = self.config.fetch_batch_size
+        next_uids = self.uids[-batch_size:]
+        del self.uids[-batch_size:]
+        logger.trace("Fetching messages with UIDs {}", next_uids)
+        messages = await asyncio.to_thread(self._fetch, next_uids)
+        if len(messages) < len(next_uids):
+            fetched_uids = {message.uid for message in messages}
+            logger.warning(
+                "Failed to fetch messages with UIDs {}",
+                [uid for uid in next_uids if uid not in fetched_uids],
+            )
+        return messages
 
     @override
     async def run(self):
+        if not self.connected:
+            # Back off so that the attempts span a server restart: 2, 4, ..., 32 seconds
+            await asyncio.sleep(min(2**self.reconnect_attempts, self.MAX_RECONNECT_DELAY))
+            await asyncio.to_thread(self.reconnect)
+
         # Keep fetching the UIDs we already have before polling for new ones
         if self.uids:
-            message = await self.fetch_next_uid()
-            if message is not None:
-                logger.trace("Callback processing message with UID {}", message.uid)
-                await self.callback(self.mb, message)
+            messages = await self.fetch_next_batch()
+            if messages:
+                logger.trace("Callback processing {} messages", len(messages))
+                await self.callback(self.mb, messages)
             return
 
-        new_messages = self.mb.folder.status().get("MESSAGES", 0)
+        status = await asyncio.to_thread(self.mb.folder.status)
+        new_messages = status.get("MESSAGES", 0)
         logger.trace("New messages count: {}", new_messages)
         if new_messages > 0:
             new_uids = await asyncio.to_thread(self.mb.uids)
             self.uids.extend(new_uids)
             logger.trace("Fetched {} new uids", len(self.uids))
-        else:
+        elif self.supports_idle:
             logger.trace("No new messages, IDLE for {} seconds", self.config.idle_timeout)
-            # IDLE timeout doesn't play well with asyncio
-            # TODO: find solution to use IDLE without hanging the process or
-            # messing up the IMAP client states
-            await asyncio.sleep(self.config.idle_timeout)
-            # await asyncio.to_thread(self.mb.idle.wait, self.config.idle_timeout)
-            return
+            responses = await self.unless_stopped(self.idle())
+            logger.trace("IDLE responses: {}", responses)
+        else:
+            logger.trace("No new messages, sleeping for {} seconds", self.config.idle_timeout)
+            await self.unless_stopped(asyncio.sleep(self.config.idle_timeout))
 
     @override
     def on_cancelled(self):
         try:
-            # Safely close the mailbox connection
-            # Don't try to stop IDLE explicitly as it may cause state issues
+            # IDLE has already been ended by the time the task is cancelled
             logger.debug("Logging out from mailbox")
             self.mb.logout()
         except Exception as e:
@@ -122,9 +200,16 @@ class MailboxWatcher(AsyncTask):
 
     @override
     def handle_exception(self, exc: Exception):
+        if (
+            isinstance(exc, IMAP_CONNECTION_ERRORS)
+            and self.reconnect_attempts < self.MAX_RECONNECT_ATTEMPTS
+        ):
+            logger.warning("IMAP connection error, will reconnect: {}", exc)
+            self.connected = False
+            self.reconnect_attempts += 1
+            return
+
         try:
-            # Safely close the mailbox connection
-            # Don't try to stop IDLE explicitly as it may cause state issues
             logger.exception("Logging out from mailbox due to exception", exc_info=exc)
             self.mb.logout()
         except Exception as e:
@@ -147,11 +232,25 @@ class MailboxWatcher(AsyncTask):
                 self.mb.folder.create(self.config.blocked_folder)
 
 
+# Max UIDs per MOVE/DELETE command; keeps UID sets well under the ~1000 character
+# command line length recommended by RFC 2683
+UID_CHUNK_SIZE = 100
+
+# Number of recently enqueued UIDs remembered, to avoid enqueuing a message twice
+SEEN_UIDS_SIZE = 4096
+
+# Messages with a larger header block are blocked without being parsed, since the
+# stdlib email parser can take minutes on some crafted headers (bpo-42909)
+MAX_HEADER_LENGTH = 64 * 1024
+
+
 def move_or_delete(mb: BaseMailBox, uid: str | list[str], folder: str | None):
+    if not uid:
+        return
     if folder:
-        mb.move(uid, folder)
+        mb.move(uid, folder, chunks=UID_CHUNK_SIZE)
     else:
-        mb.delete(uid)
+        mb.delete(uid, chunks=UID_CHUNK_SIZE)
 
 
 def filter_and_enqueue(
@@ -159,21 +258,57 @@ def filter_and_enqueue(
     secf: SecurityFilter | None,
     replied_folder: str | None,
     blocked_folder: str | None,
-) -> Callable[[BaseMailBox, IMAPRawMessage], Awaitable[None]]:
-    if secf is None:
+) -> Callable[[BaseMailBox, list[IMAPRawMessage]], Awaitable[None]]:
+    """
+    Make a callback which filters and enqueues a batch of messages, then moves
+    them to replied_folder or blocked_folder, with one command per folder.
 
-        async def qcallback(mb: BaseMailBox, message: IMAPRawMessage):
-            await q.put(message)
-            move_or_delete(mb, cast(str, message.uid), replied_folder)
-    else:
+    If the queue stays full for its whole timeout, the rest of the batch is left in
+    the folder, to be fetched again on a later run.
+
+    Messages that were handled are moved even if a later one fails, so that they
+    are not fetched and enqueued again. If a message is fetched again anyway (e.g.
+    because moving it failed), it is moved without being enqueued a second time.
 
-        async def qcallback(mb: BaseMailBox, message: IMAPRawMessage):
-            res = secf.apply(message.parsed())
-            if res == Action.ALLOW:
-                await q.put(message)
-                move_or_delete(mb, cast(str, message.uid), replied_folder)
-            else:
-                move_or_delete(mb, cast(str, message.uid), blocked_folder)
+    Parsing and filtering (which may do DNS lookups for DKIM) and moving messages
+    run in a worker thread, so they don't block the event loop. Messages are
+    enqueued raw; BotReplySpawnTask parses allowed messages again, also in a thread.
+    """
+    seen_uids: OrderedDict[str, None] = OrderedDict()
+
+    def check(message: IMAPRawMessage) -> Action:
+        if message.header_length() > MAX_HEADER_LENGTH:
+            logger.log(LogLevel.SECURITY, "BLOCKED - header too large - UID {}", message.uid)
+            return Action.BLOCK
+        if secf is None:
+            return Action.ALLOW
+        return secf.apply(message.parsed())
+
+    async def qcallback(mb: BaseMailBox, messages: list[IMAPRawMessage]):
+        replied_uids: list[str] = []
+        blocked_uids: list[str] = []
+        try:
+            for message in messages:
+                uid = cast(str, message.uid)
+                if uid in seen_uids:
+                    logger.warning("Message with UID {} was already enqueued, skipping", uid)
+                    replied_uids.append(uid)
+                elif await asyncio.to_thread(check, message) == Action.ALLOW:
+                    try:
+                        await q.put(message)
+                    except TimeoutError:
+                        # The rest of the batch stays in the folder and is fetched again
+                        logger.warning("Receive queue is full, will retry later")
+                        break
+                    replied_uids.append(uid)
+                    seen_uids[uid] = None
+                    if len(seen_uids) > SEEN_UIDS_SIZE:
+                        seen_uids.popitem(last=False)
+                else:
+                    blocked_uids.append(uid)
+        finally:
+            await asyncio.to_thread(move_or_delete, mb, replied_uids, replied_folder)
+            await asyncio.to_thread(move_or_delete, mb, blocked_uids, blocked_folder)
 
     return qcallback
 
@@ -6,14 +6,17 @@ from dataclasses import dataclass
 from email.message import EmailMessage
 from typing import Self
 
+from imap_tools.consts import UID_PATTERN
 from imap_tools.message import MailMessage
 from imap_tools.utils import EmailAddress
 
 
-@dataclass(slots=True)
+@dataclass(slots=True, frozen=True)
 class SimpleEmailMessage:
     """
     Used for composing simple plaintext messages.
+
+    Instances are immutable once created, since they are shared through mail queues.
     """
 
     addr_from: EmailAddress
@@ -48,6 +51,14 @@ class SimpleEmailMessage:
         return msg
 
 
+def parse_uid(uid_data: bytes, flag_data: list[bytes]) -> str | None:
+    # Same as MailMessage.uid; depending on the server, the UID is in either part
+    for raw_uid_item in [uid_data, *flag_data]:
+        if uid_match := UID_PATTERN.search(raw_uid_item.decode()):
+            return uid_match.group("uid")
+    return None
+
+
 @dataclass(slots=True)
 class IMAPRawMessage:
     """
@@ -62,7 +73,21 @@ class IMAPRawMessage:
     @classmethod
     def from_fetch(cls, fetch_data: list) -> Self:
         message_data, uid_data, flag_data = MailMessage._get_message_data_parts(fetch_data)
-        return cls(message_data=message_data, uid_data=uid_data, flag_data=flag_data)
+        return cls(
+            message_data=message_data,
+            uid_data=uid_data,
+            flag_data=flag_data,
+            uid=parse_uid(uid_data, flag_data),
+        )
+
+    def header_length(self) -> int:
+        """
+        Length of the header block in bytes, found without parsing the message.
+        """
+        end = self.message_data.find(b"\r\n\r\n")
+        if end == -1:
+            end = self.message_data.find(b"\n\n")
+        return len(self.message_data) if end == -1 else end
 
     def parsed(self) -> IMAPMessage:
         return IMAPMessage(self)
@@ -99,17 +124,30 @@ class IMAPMessage(MailMessage):
     def addrs_to(self) -> tuple[EmailAddress, ...]:
         return self.to_values
 
+    def get_header(self, name: str) -> str | None:
+        """
+        Get the first value of a header, or None if it is missing.
+
+        Uses the cached MailMessage.headers dict, rather than email.message.Message.get
+        which scans the whole header list on every call.
+        """
+        values = self.headers.get(name.lower())
+        return values[0] if values else None
+
+    def get_all_headers(self, name: str) -> tuple[str, ...]:
+        return self.headers.get(name.lower(), ())
+
     @property
     def in_reply_to(self) -> str | None:
-        return self.obj.get("In-Reply-To")
+        return self.get_header("In-Reply-To")
 
     @property
     def references(self) -> str | None:
-        return self.obj.get("References")
+        return self.get_header("References")
 
     @property
     def message_id(self) -> str | None:
-        return self.obj.get("Message-Id")
+        return self.get_header("Message-Id")
 
     def __str__(self) -> str:
         from_str = self.from_values.full if self.from_values else "unknown"
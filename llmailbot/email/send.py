@@ -1,5 +1,6 @@
 import abc
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from smtplib import SMTP, SMTP_SSL
 from ssl import SSLContext
 from typing import Iterable
@@ -8,6 +9,7 @@ from loguru import logger
 
 from llmailbot.config import EncryptionMode, SMTPConfig
 from llmailbot.email.model import SimpleEmailMessage
+from llmailbot.email.tls import default_ssl_context
 from llmailbot.queue.core import AsyncQueue, SyncQueue, to_async_queue
 from llmailbot.taskrun import AsyncTask, TaskDone
 
@@ -17,17 +19,22 @@ def connect_smtp(
     ssl_context: SSLContext | None = None,
     timeout: int = 30,
 ) -> SMTP | SMTP_SSL:
-    if config.encryption == EncryptionMode.STARTTLS:
-        client = SMTP(host=config.server, port=config.port, timeout=timeout)
-        client.starttls(context=ssl_context)
-    elif config.encryption == EncryptionMode.SSL_TLS:
+    ssl_context = ssl_context or default_ssl_context()
+    if config.encryption == EncryptionMode.SSL_TLS:
         client = SMTP_SSL(
             host=config.server, port=config.port, timeout=timeout, context=ssl_context
         )
     else:
         client = SMTP(host=config.server, port=config.port, timeout=timeout)
 
-    client.login(config.username, config.password.get_secret_value())
+    # Don't leak the connection if STARTTLS or login fails
+    try:
+        if config.encryption == EncryptionMode.STARTTLS:
+            client.starttls(context=ssl_context)
+        client.login(config.username, config.password.get_secret_value())
+    except BaseException:
+        client.close()
+        raise
     return client
 
 
@@ -42,39 +49,111 @@ class MailSender(abc.ABC):
 
 class SMTPSender(MailSender):
     def send(self, emails: Iterable[SimpleEmailMessage]) -> None:
-        with connect_smtp(self.smtp_config) as client:
+        # Only raises if the connection can't be set up, before anything is sent,
+        # so the caller can safely retry the whole batch
+        client = connect_smtp(self.smtp_config)
+        try:
             for email in emails:
-                msg = email.to_email_message()
-                client.send_message(
-                    msg=msg,
-                    from_addr=email.addr_from.email,
-                    to_addrs=[a.email for a in email.addrs_to],
-                )
+                # One failed email must not lose the rest of the batch
+                try:
+                    client.send_message(
+                        msg=email.to_email_message(),
+                        from_addr=email.addr_from.email,
+                        to_addrs=[a.email for a in email.addrs_to],
+                    )
+                except Exception:
+                    logger.opt(lazy=True).exception("Failed to send {}", email.summary)
+                else:
+                    logger.opt(lazy=True).success("Sent {}", email.summary)
+        finally:
+            try:
                 client.quit()
+            except OSError:
+                client.close()
 
 
 class StdoutFakeMailSender(MailSender):
-    def send(self, email: SimpleEmailMessage) -> None:
-        print(str(email))
+    def send(self, emails: Iterable[SimpleEmailMessage]) -> None:
+        for email in emails:
+            print(str(email))
+            logger.opt(lazy=True).success("Sent {}", email.summary)
+
+
+# Maximum delay between send retries, in seconds
+MAX_RETRY_DELAY = 30
 
 
 class SendMailTask(AsyncTask[None]):
-    def __init__(self, sender: MailSender, queue: AsyncQueue[SimpleEmailMessage]):
+    """
+    SendMailTask sends emails from the outgoing mail queue.
+
+    Emails already waiting in the queue are sent in batches of up to batch_size,
+    over a single SMTP connection. If the connection fails, the batch is retried
+    with exponential backoff, up to retries times.
+
+    Blocking SMTP calls run in a dedicated single-thread executor, so that slow
+    SMTP servers don't tie up the event loop's default executor.
+    """
+
+    def __init__(
+        self,
+        sender: MailSender,
+        queue: AsyncQueue[SimpleEmailMessage],
+        batch_size: int = 1,
+        retries: int = 3,
+    ):
         super().__init__(
             name=f"SendMail<{sender.smtp_config.username}@{sender.smtp_config.server}>"
         )
         self.name = self._name
         self.sender = sender
         self.mailq = queue
+        self.batch_size = batch_size
+        self.retries = retries
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=self.name)
+
+    async def drain_batch(self) -> list[SimpleEmailMessage]:
+        """
+        Wait for an email, then take any others already in the queue, up to batch_size.
+        """
+        email = await self.unless_stopped(self.mailq.get())
+        if not email:
+            return []
+        if self.batch_size <= 1:
+            return [email]
+        # email is already off the queue, so it must be sent even if the rest can't be taken
+        try:
+            return [email, *await self.mailq.get_many_nowait(self.batch_size - 1)]
+        except Exception:
+            logger.exception("Failed to take more emails from the queue, sending one")
+            return [email]
 
     async def run(self) -> TaskDone | None:
-        # TODO: implement batching to avoid re-connecting for every email
-        email = await self.mailq.get()
-        if email:
-            await asyncio.get_running_loop().run_in_executor(
-                None, lambda: self.sender.send([email])
-            )
-            logger.success("Sent {}", email.summary())
+        batch = await self.drain_batch()
+        if not batch:
+            return
+        # The emails are already off the queue, so retry when the SMTP connection fails
+        for retry_num in range(self.retries + 1):
+            try:
+                await asyncio.get_running_loop().run_in_executor(
+                    self.executor, lambda: self.sender.send(batch)
+                )
+                return
+            except Exception:
+                logger.exception(
+                    "Exception sending {} emails (retry {} of {})",
+                    len(batch),
+                    retry_num,
+                    self.retries,
+                )
+                if retry_num < self.retries:
+                    await asyncio.sleep(min(2**retry_num, MAX_RETRY_DELAY))
+        for email in batch:
+            logger.opt(lazy=True).error("Failed to send, dropping {}", email.summary)
+
+    def on_cancelled(self):
+        super().on_cancelled()
+        self.executor.shutdown(wait=False)
 
 
 def make_mail_sender(config: SMTPConfig) -> MailSender:
@@ -86,4 +165,4 @@ def make_mail_send_task(
     queue: AsyncQueue[SimpleEmailMessage] | SyncQueue[SimpleEmailMessage],
 ):
     sender = make_mail_sender(config)
-    return SendMailTask(sender, to_async_queue(queue))
+    return SendMailTask(sender, to_async_queue(queue), batch_size=config.send_batch_size)
@@ -0,0 +1,17 @@
+import ssl
+from functools import lru_cache
+
+
+@lru_cache(maxsize=1)
+def default_ssl_context() -> ssl.SSLContext:
+    """
+    Get the SSLContext shared by all IMAP and SMTP connections.
+
+    It is created once per process rather than on every (re)connection.
+    Like the context imaplib and smtplib create when none is passed in,
+    it does not verify server certificates or hostnames.
+    """
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
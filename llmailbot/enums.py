@@ -1,6 +1,8 @@
 import re
 from enum import StrEnum
-from functools import lru_cache
+from typing import Self
+
+RE_WHITESPACE = re.compile(r"\s+")
 
 
 class CaseInsensitiveStrEnum(StrEnum):
@@ -8,21 +10,21 @@ class CaseInsensitiveStrEnum(StrEnum):
     A string enum that is whitespace-insensitive and case-insensitive when comparing values.
     """
 
+    _normalized_members: dict[str, Self]
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._normalized_members = {cls._normalize(member.value): member for member in cls}
+
     @staticmethod
     def _normalize(value: str) -> str:
-        return re.sub(r"\s+", "", value).lower()
+        return RE_WHITESPACE.sub("", value).lower()
 
     @classmethod
-    @lru_cache(maxsize=128)
     def _missing_(cls, value):
         if not isinstance(value, str):
             return None
-
-        normalized_value = cls._normalize(value)
-        for member in cls:
-            if cls._normalize(member.value) == normalized_value:
-                return member
-        return None
+        return cls._normalized_members.get(cls._normalize(value))
 
 
 class EncryptionMode(CaseInsensitiveStrEnum):
@@ -56,3 +58,9 @@ class VerifyMode(CaseInsensitiveStrEnum):
 class QueueType(CaseInsensitiveStrEnum):
     MEMORY = "memory"
     REDIS = "redis"
+
+
+class AppComponent(StrEnum):
+    FETCH = "fetch"
+    REPLY = "reply"
+    SEND = "send"
@@ -21,4 +21,15 @@ class LogLevel(StrEnum):
 def setup_logging(log_file=None, log_level: str | LogLevel = LogLevel.INFO):
     log_level = LogLevel(log_level.upper())
     logger.remove()
-    logger.add(log_file or sys.stderr, level=log_level.value)
+    # enqueue=True moves only the sink write to a background thread, keeping file I/O
+    # off the event loop; records (and exceptions) are still formatted in the calling
+    # thread, and logger.complete() must be called to flush on shutdown.
+    # diagnose=False keeps local variable values, such as passwords in connect_mailbox
+    # and connect_smtp frames, out of logged tracebacks, and skips inspecting them.
+    logger.add(
+        log_file or sys.stderr,
+        level=log_level.value,
+        enqueue=True,
+        backtrace=False,
+        diagnose=False,
+    )
@@ -1,5 +1,6 @@
 import abc
 import asyncio
+import functools
 import time
 from typing import Any, Iterable
 
@@ -15,14 +16,18 @@ from llmailbot.taskrun import AsyncTask, TaskDone
 
 
 def quoted(txt: str) -> str:
-    return "> " + "\n> ".join(txt.splitlines())
+    txt = txt.replace("\r\n", "\n").removesuffix("\n")
+    return "> " + txt.replace("\n", "\n> ")
 
 
-def quote_email(email: IMAPMessage) -> str:
+def quote_email(email: IMAPMessage, max_length: int | None = None) -> str:
     quote_title = f"{email.addr_from.name or email.addr_from.email} said"
     if email.date:
         quote_title += f" at {email.date.strftime('%Y-%m-%d %H:%M')}:"
-    return f"{quote_title}\n\n{quoted(email.text)}"
+    text = email.text
+    if max_length is not None and len(text) > max_length:
+        text = text[:max_length] + "\n[...]"
+    return f"{quote_title}\n\n{quoted(text)}"
 
 
 class MailBot(abc.ABC):
@@ -42,16 +47,26 @@ class MailBot(abc.ABC):
 
     def __init__(self, specs: list[ModelSpec]):
         self.specs = specs
+        # Exact addresses are looked up in a dict; only regex specs are tried one by one.
+        # Indexes preserve the config order: the first matching spec wins.
+        self.specs_by_address: dict[str, tuple[int, ModelSpec]] = {}
+        self.regex_specs: list[tuple[int, ModelSpec]] = []
+        for i, spec in enumerate(specs):
+            if spec._address_regex is not None:
+                self.regex_specs.append((i, spec))
+            elif spec.address is not None:
+                self.specs_by_address.setdefault(spec.address, (i, spec))
 
     def _get_spec(self, to_addrs: list[str]) -> tuple[str, ModelSpec] | tuple[None, None]:
         for addr in to_addrs:
-            for spec in self.specs:
-                if spec._address_regex is not None:
-                    if spec._address_regex.match(addr):
-                        return addr, spec
-                else:
-                    if spec.address == addr:
-                        return addr, spec
+            exact = self.specs_by_address.get(addr)
+            for i, spec in self.regex_specs:
+                if exact is not None and i > exact[0]:
+                    break
+                if spec._address_regex.match(addr):  # pyright: ignore[reportOptionalMemberAccess]
+                    return addr, spec
+            if exact is not None:
+                return addr, exact[1]
 
         logger.warning("Received email for address with no matching configuration: {}", to_addrs)
         return None, None
@@ -62,7 +77,8 @@ class MailBot(abc.ABC):
             return None
         conversation = str(email)
         reply_body = await self.compose_reply(spec, bot_email, email.addr_from.email, conversation)
-        reply_body = reply_body + "\n\n" + quote_email(email)
+        # Quote no more of the original than the model was given
+        reply_body = f"{reply_body}\n\n{quote_email(email, spec.max_input_length)}"
         return email.create_reply(EmailAddress(spec.name, bot_email), reply_body)
 
 
@@ -180,6 +196,10 @@ def make_mailbot(
         return LangChainMailBot(specs, configurable_fields)
 
 
+# Maximum delay between reply retries, in seconds
+MAX_RETRY_DELAY = 30
+
+
 class BotReplyTask(AsyncTask[None]):
     """
     BotReplyTask is a task that runs a mailbot to reply to a single email.
@@ -188,7 +208,7 @@ class BotReplyTask(AsyncTask[None]):
         mailbot: The mailbot instance to run
         email: The user email being replied to
         send_queue: The outgoing email queue
-        retries: Number of retries on failure
+        retries: Number of retries on failure, with exponential backoff
         queue_timeout: Timeout for queue operations in seconds (high value hangs on exit)
     """
 
@@ -214,13 +234,15 @@ class BotReplyTask(AsyncTask[None]):
 
     async def run(self) -> TaskDone[None] | None:
         email = self.email
+        # Built at most once, and only if a log record needs it
+        summary = functools.cache(email.summary)
         # TODO: implement retry logic in TaskRunner
         for retry_num in range(self.retries + 1):
             try:
-                logger.info(
+                logger.opt(lazy=True).info(
                     "{} generating reply to {}",
-                    self.name,
-                    email.summary(),
+                    lambda: self.name,
+                    summary,
                 )
                 reply = await self.mailbot.reply(email)
                 if reply is not None:
@@ -229,10 +251,12 @@ class BotReplyTask(AsyncTask[None]):
             except Exception:
                 logger.exception(
                     "Exception replying to email {} (retry {} of {})",
-                    email.summary(),
+                    summary(),
                     retry_num,
                     self.retries,
                 )
+                if retry_num < self.retries:
+                    await asyncio.sleep(min(2**retry_num, MAX_RETRY_DELAY))
         return TaskDone(None)
 
 
@@ -241,12 +265,15 @@ class BotReplySpawnTask(AsyncTask[None]):
     BotReplySpawnTask creates and runs a BotReplyTask for each email
     received from the incoming email queue.
 
+    Replies are composed concurrently, up to max_concurrency at a time; when that
+    many are in progress, no more emails are taken from the queue until one finishes.
+
     Args:
         mailbot: The mailbot instance to run
         recv_queue: Incoming email queue
         send_queue: Outgoing email queue
         retries: Number of retries on failure for reply task (default: 3)
-        one_at_a_time: If True, will only spawn one reply task at a time (default: False)
+        max_concurrency: Maximum number of reply tasks running at once (default: 8)
         instance_n: Instance number for logging (default: None)
     """
 
@@ -256,36 +283,64 @@ class BotReplySpawnTask(AsyncTask[None]):
         recv_queue: AsyncQueue[IMAPRawMessage],
         send_queue: AsyncQueue[SimpleEmailMessage],
         retries: int = 3,
-        one_at_a_time: bool = False,
+        max_concurrency: int = 8,
         instance_n: int | None = None,
     ):
         self.mailbot = mailbot
         self.recvq = recv_queue
         self.sendq = send_queue
         self.retries = retries
-        self.one_at_a_time = one_at_a_time
+        self.concurrency = asyncio.Semaphore(max_concurrency)
+        # Keep references to running replies, so they are not garbage collected
+        self.replies: set[asyncio.Task] = set()
         self.name = f"{self.__class__.__name__}<{mailbot.__class__.__name__}>"
         if instance_n is not None:
             self.name += f".{instance_n}"
         super().__init__(self.name)
 
+    async def reply(self, email: IMAPRawMessage) -> None:
+        # Runs in a bare asyncio task, so errors must be logged here or they are lost
+        try:
+            # Parse in a worker thread, like the fetch callback, to keep it off the loop
+            parsed = await asyncio.to_thread(email.parsed)
+            reply_task = BotReplyTask(
+                mailbot=self.mailbot,
+                email=parsed,
+                send_queue=self.sendq,
+                retries=self.retries,
+            )
+            await reply_task.runner().start().wait()
+        except Exception:
+            logger.exception("Failed to reply to email {}", email.uid)
+        finally:
+            self.concurrency.release()
+
     async def run(self) -> TaskDone | None:
+        if not await self.unless_stopped(self.concurrency.acquire()):
+            return
+
         logger.trace("Waiting for message in mail queue")
-        email = await self.recvq.get()
+        try:
+            email = await self.unless_stopped(self.recvq.get())
+        except BaseException:
+            self.concurrency.release()
+            raise
         if not email:
             logger.trace("No message in mail queue")
+            self.concurrency.release()
             return
 
-        reply_task = BotReplyTask(
-            mailbot=self.mailbot,
-            email=email.parsed(),
-            send_queue=self.sendq,
-            retries=self.retries,
-        )
-        reply_runner = reply_task.runner()
-        reply_runner.start()
-        if self.one_at_a_time:
-            await reply_runner.wait()
+        reply = asyncio.create_task(self.reply(email))
+        self.replies.add(reply)
+        reply.add_done_callback(self.replies.discard)
+
+    async def on_cancelled(self):
+        super().on_cancelled()
+        # Don't leave replies running (and pushing to the send queue) after shutdown
+        replies = list(self.replies)
+        for reply in replies:
+            reply.cancel()
+        await asyncio.gather(*replies, return_exceptions=True)
 
 
 def make_bot_reply_spawn_task(
@@ -300,4 +355,5 @@ def make_bot_reply_spawn_task(
         ),
         recv_queue=recv_queue,
         send_queue=send_queue,
+        max_concurrency=config.max_concurrent_replies,
     )
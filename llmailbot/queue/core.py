@@ -1,6 +1,8 @@
 import abc
 import asyncio
-from typing import Generic, TypeVar
+from typing import Awaitable, Callable, Generic, TypeVar
+
+from loguru import logger
 
 T = TypeVar("T")
 
@@ -14,6 +16,22 @@ class SyncQueue(abc.ABC, Generic[T]):
     def get(self) -> T | None:
         pass
 
+    @abc.abstractmethod
+    def get_nowait(self) -> T | None:
+        """
+        Get a message if one is immediately available, without blocking.
+        """
+        pass
+
+    def get_many_nowait(self, max_n: int) -> list[T]:
+        """
+        Get up to max_n messages that are immediately available, without blocking.
+        """
+        messages = []
+        while len(messages) < max_n and (message := self.get_nowait()) is not None:
+            messages.append(message)
+        return messages
+
 
 class AsyncQueue(abc.ABC, Generic[T]):
     @abc.abstractmethod
@@ -22,18 +40,94 @@ class AsyncQueue(abc.ABC, Generic[T]):
 
     @abc.abstractmethod
     async def get(self) -> T | None:
+        """
+        Wait for a message, up to the queue's timeout.
+
+        Must be safe to cancel: a message taken off the queue after the get was
+        cancelled must be put back rather than dropped.
+        """
         pass
 
+    @abc.abstractmethod
+    async def get_nowait(self) -> T | None:
+        """
+        Get a message if one is immediately available, without waiting.
+        """
+        pass
+
+    async def get_many_nowait(self, max_n: int) -> list[T]:
+        """
+        Get up to max_n messages that are immediately available, without waiting.
+        """
+        messages = []
+        while len(messages) < max_n and (message := await self.get_nowait()) is not None:
+            messages.append(message)
+        return messages
+
+
+# Strong references to pending put backs, so they are not garbage collected mid-flight
+_put_back_tasks: set[asyncio.Task] = set()
+
+
+async def _put_back(put: Callable[[T], Awaitable[None]], message: T) -> None:
+    try:
+        await put(message)
+    except Exception:
+        logger.exception("Failed to put back message taken by a cancelled get, it is lost")
+
+
+async def get_cancel_safe(
+    fut: asyncio.Future[T | None], put_back: Callable[[T], Awaitable[None]]
+) -> T | None:
+    """
+    Await a get already running in fut, which cannot be interrupted once started
+    (e.g. a blocking get in a thread, or a BRPOP the server may have completed).
+
+    If the caller is cancelled, fut is left to finish, and the message it returns,
+    if any, is passed to put_back instead of being dropped.
+    """
+    try:
+        return await asyncio.shield(fut)
+    except asyncio.CancelledError:
+
+        def on_done(f: asyncio.Future[T | None]) -> None:
+            if f.cancelled() or f.exception() is not None or (message := f.result()) is None:
+                return
+            task = asyncio.ensure_future(_put_back(put_back, message))
+            _put_back_tasks.add(task)
+            task.add_done_callback(_put_back_tasks.discard)
+
+        fut.add_done_callback(on_done)
+        raise
+
 
 class AsyncAdapter(AsyncQueue[T]):
+    """
+    Runs the blocking calls of a SyncQueue in the event loop's default executor.
+
+    Uses loop.run_in_executor rather than asyncio.to_thread, which copies the
+    contextvars context on every call.
+    """
+
     def __init__(self, queue: SyncQueue[T]):
         self.queue = queue
 
     async def put(self, message: T) -> None:
-        await asyncio.to_thread(self.queue.put, message)
+        await asyncio.get_running_loop().run_in_executor(None, self.queue.put, message)
 
     async def get(self) -> T | None:
-        return await asyncio.to_thread(self.queue.get)
+        # Cancelling doesn't stop the executor's get, so a late message is requeued
+        return await get_cancel_safe(
+            asyncio.get_running_loop().run_in_executor(None, self.queue.get), self.put
+        )
+
+    async def get_nowait(self) -> T | None:
+        return await asyncio.get_running_loop().run_in_executor(None, self.queue.get_nowait)
+
+    async def get_many_nowait(self, max_n: int) -> list[T]:
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self.queue.get_many_nowait, max_n
+        )
 
 
 def to_async_queue(q: SyncQueue[T] | AsyncQueue[T]) -> AsyncQueue[T]:
@@ -1,14 +1,29 @@
 import asyncio
+import atexit
 import multiprocessing
 import multiprocessing.managers
 import queue
+import threading
 
 from .core import AsyncQueue, SyncQueue, T
 
 
 class MemoryQueue(SyncQueue[T]):
-    def __init__(self, maxsize: int = 0, timeout: float = 5.0):
-        self.msgq = queue.Queue(maxsize=maxsize)
+    """
+    In-process queue for threads.
+
+    make_queue uses AsyncioQueue for memory queues, since all tasks share one
+    event loop; this is only for code that needs a SyncQueue.
+
+    Unbounded queues (maxsize=0) use queue.SimpleQueue, which is implemented in C
+    and is faster than queue.Queue. With timeout=None, get blocks until a message
+    is available.
+    """
+
+    def __init__(self, maxsize: int = 0, timeout: float | None = 5.0):
+        self.msgq: queue.Queue[T] | queue.SimpleQueue[T] = (
+            queue.Queue(maxsize=maxsize) if maxsize > 0 else queue.SimpleQueue()
+        )
         self.timeout = timeout
 
     def put(self, message: T) -> None:
@@ -20,14 +35,28 @@ class MemoryQueue(SyncQueue[T]):
         except queue.Empty:
             return None
 
+    def get_nowait(self) -> T | None:
+        try:
+            return self.msgq.get_nowait()
+        except queue.Empty:
+            return None
+
 
 _manager = None
+_manager_lock = threading.Lock()
 
 
 def get_manager() -> multiprocessing.managers.SyncManager:
+    """
+    Get the process-wide multiprocessing manager, starting it on first use.
+
+    The manager process is shut down at exit.
+    """
     global _manager
-    if _manager is None:
-        _manager = multiprocessing.Manager()
+    with _manager_lock:
+        if _manager is None:
+            _manager = multiprocessing.Manager()
+            atexit.register(_manager.shutdown)
     return _manager
 
 
@@ -45,17 +74,45 @@ class ManagedMemoryQueue(SyncQueue[T]):
         except queue.Empty:
             return None
 
+    def get_nowait(self) -> T | None:
+        try:
+            return self.msgq.get_nowait()
+        except queue.Empty:
+            return None
+
 
 class AsyncioQueue(AsyncQueue[T]):
+    """
+    In-process queue for tasks running on the same event loop.
+
+    put and get complete immediately when they can; only an empty (or full) queue
+    waits on the loop, up to timeout seconds. No threads are involved.
+    """
+
     def __init__(self, maxsize: int = 0, timeout: float = 5.0):
         self.msgq = asyncio.Queue(maxsize=maxsize)
         self.timeout = timeout
 
     async def put(self, message: T) -> None:
-        await asyncio.wait_for(self.msgq.put(message), timeout=self.timeout)
+        try:
+            self.msgq.put_nowait(message)
+        except asyncio.QueueFull:
+            async with asyncio.timeout(self.timeout):
+                await self.msgq.put(message)
 
     async def get(self) -> T | None:
         try:
-            return await asyncio.wait_for(self.msgq.get(), timeout=self.timeout)
+            return self.msgq.get_nowait()
+        except asyncio.QueueEmpty:
+            pass
+        try:
+            async with asyncio.timeout(self.timeout):
+                return await self.msgq.get()
         except TimeoutError:
             return None
+
+    async def get_nowait(self) -> T | None:
+        try:
+            return self.msgq.get_nowait()
+        except asyncio.QueueEmpty:
+            return None
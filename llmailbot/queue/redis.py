@@ -6,7 +6,7 @@ from loguru import logger
 
 from llmailbot.config import RedisConfig
 
-from .core import AsyncQueue, SyncQueue, T
+from .core import AsyncQueue, SyncQueue, T, get_cancel_safe
 
 try:
     import redis
@@ -49,14 +49,45 @@ class AsyncRedisQueue(AsyncQueue[T]):
             timeout=self.timeout,
         )
 
-    async def get(self) -> T | None:
+    async def _brpop(self) -> bytes | None:
         vals = await cast(
             Awaitable[list[bytes]], self.redis.brpop([self.key], timeout=self.timeout)
         )
         if not vals:
             return None
-        logger.trace("Got {} values from Redis queue", repr([type(val) for val in vals]))
-        return self.deserialize(vals[1])
+        logger.opt(lazy=True).trace(
+            "Got {} values from Redis queue", lambda: repr([type(val) for val in vals])
+        )
+        return vals[1]
+
+    async def _push_back(self, val: bytes) -> None:
+        # RPUSH returns it to the end BRPOP pops from, so it is still next in line
+        await cast(Awaitable[int], self.redis.rpush(self.key, val))
+
+    async def get(self) -> T | None:
+        # The server may pop the message before a cancel reaches the client,
+        # so BRPOP is left to finish, and a late message is pushed back
+        val = await get_cancel_safe(asyncio.ensure_future(self._brpop()), self._push_back)
+        if val is None:
+            return None
+        return self.deserialize(val)
+
+    async def get_nowait(self) -> T | None:
+        val = await cast(Awaitable[bytes | None], self.redis.rpop(self.key))
+        if val is None:
+            return None
+        return self.deserialize(val)
+
+    async def get_many_nowait(self, max_n: int) -> list[T]:
+        if max_n <= 0:
+            return []
+        # RPOP with a count takes them all in one round trip, but needs Redis 6.2+;
+        # older servers reject the count without popping anything
+        try:
+            vals = await cast(Awaitable[list[bytes] | None], self.redis.rpop(self.key, max_n))
+        except redis.ResponseError:
+            return await super().get_many_nowait(max_n)
+        return [self.deserialize(val) for val in vals or ()]
 
 
 class SyncRedisQueue(SyncQueue[T]):
@@ -87,5 +118,24 @@ class SyncRedisQueue(SyncQueue[T]):
         vals = cast(list[bytes], self.redis.brpop([self.key], timeout=self.timeout))
         if not vals:
             return None
-        logger.trace("Got {} values from Redis queue", repr([type(val) for val in vals]))
+        logger.opt(lazy=True).trace(
+            "Got {} values from Redis queue", lambda: repr([type(val) for val in vals])
+        )
         return self.deserialize(vals[1])
+
+    def get_nowait(self) -> T | None:
+        val = cast(bytes | None, self.redis.rpop(self.key))
+        if val is None:
+            return None
+        return self.deserialize(val)
+
+    def get_many_nowait(self, max_n: int) -> list[T]:
+        if max_n <= 0:
+            return []
+        # RPOP with a count takes them all in one round trip, but needs Redis 6.2+;
+        # older servers reject the count without popping anything
+        try:
+            vals = cast(list[bytes] | None, self.redis.rpop(self.key, max_n))
+        except redis.ResponseError:
+            return super().get_many_nowait(max_n)
+        return [self.deserialize(val) for val in vals or ()]
@@ -1,4 +1,5 @@
 import datetime
+import time
 from enum import Enum
 
 
@@ -10,22 +11,31 @@ class LimitResult(Enum):
 # TODO: use bucket algorithm instead
 # TODO: implement RedisRateLimiter
 class RateLimiter:
+    """
+    Fixed-window rate limiter.
+
+    Windows are tracked as integer nanoseconds on the monotonic clock, so checks
+    are plain int comparisons and are not affected by wall clock changes.
+    """
+
     def __init__(self, duration: datetime.timedelta, limit: int):
         self.duration = duration
         self.limit = limit
+        self._duration_ns = duration // datetime.timedelta(microseconds=1) * 1000
         self._limit_count = 0
-        self._limit_expiry = datetime.datetime.now() + self.duration
+        self._limit_expiry = time.monotonic_ns() + self._duration_ns
 
-    def _reset(self, now: datetime.datetime) -> None:
+    def _reset(self, now: int) -> None:
         self._limit_count = 0
-        self._limit_expiry = now + self.duration
+        self._limit_expiry = now + self._duration_ns
 
-    def _is_expired(self, now: datetime.datetime | None = None) -> bool:
-        now = now or datetime.datetime.now()
+    def _is_expired(self, now: int | None = None) -> bool:
+        if now is None:
+            now = time.monotonic_ns()
         return now > self._limit_expiry
 
     def count(self) -> LimitResult:
-        now = datetime.datetime.now()
+        now = time.monotonic_ns()
         if self._is_expired(now):
             self._reset(now)
 
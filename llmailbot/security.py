@@ -1,6 +1,8 @@
 import abc
 import datetime
 import re
+import time
+from collections import OrderedDict
 from enum import Enum
 from typing import Iterable, NamedTuple
 
@@ -9,6 +11,7 @@ from loguru import logger
 from llmailbot.config import FilterMode, SecurityConfig
 from llmailbot.email.model import IMAPMessage
 from llmailbot.enums import VerifyMode
+from llmailbot.logging import LogLevel
 from llmailbot.ratelimit import LimitResult, RateLimiter
 
 
@@ -54,7 +57,7 @@ try:
             self.strict = strict
 
         def check(self, email: IMAPMessage) -> RuleResult:
-            dkim_signatures = email.obj.get_all("DKIM-Signature")
+            dkim_signatures = email.get_all_headers("DKIM-Signature")
             if not dkim_signatures:
                 if self.strict:
                     return RuleResult(Action.BLOCK, "No DKIM signature")
@@ -110,7 +113,7 @@ class VerifyMailFrom(Rule):
         smtp_mailfrom = None
         found_in_header = None
         for header in self.AUTHENTICATION_RESULTS_HEADERS:
-            if m := RE_SMTP_MAILFROM.search(email.obj.get(header, "")):
+            if m := RE_SMTP_MAILFROM.search(email.get_header(header) or ""):
                 smtp_mailfrom = m.group("mailfrom")
                 found_in_header = header
                 break
@@ -151,7 +154,7 @@ class VerifyXMailFrom(Rule):
         self.strict = strict
 
     def check(self, email: IMAPMessage) -> RuleResult:
-        x_mail_from = email.obj.get(self.MAIL_FROM_HEADER)
+        x_mail_from = email.get_header(self.MAIL_FROM_HEADER)
         if self.strict and x_mail_from is None:
             return RuleResult(Action.BLOCK, f"{self.MAIL_FROM_HEADER} header is missing")
         if x_mail_from != email.addr_from.email:
@@ -181,7 +184,7 @@ class FilterHeader(Rule):
         self.strict = strict
 
     def check(self, email: IMAPMessage) -> RuleResult:
-        header_value = email.obj.get(self.header)
+        header_value = email.get_header(self.header)
         if header_value is None:
             if self.strict:
                 return RuleResult(Action.BLOCK, f"{self.header} header is missing")
@@ -198,6 +201,9 @@ class FilterHeader(Rule):
 class FilterFrom(Rule):
     """
     Checks if the email sender is in a list of allowed or denied addresses.
+
+    Addresses of the form *@example.com match any sender from that domain.
+    Matching is case-insensitive.
     """
 
     def __init__(
@@ -206,21 +212,22 @@ class FilterFrom(Rule):
         addresses: Iterable[str],
     ):
         self.mode = mode
-        self.addresses = set()
-        self.domains = set()
+        exact_addresses = set()
+        domains = set()
         for addr in addresses:
-            name, domain = addr.split("@", 1)
+            name, _, domain = addr.lower().rpartition("@")
             if name == "*":
-                self.domains.add(domain)
+                domains.add(domain)
             else:
-                self.addresses.add(addr)
+                exact_addresses.add(addr.lower())
+        self.addresses = frozenset(exact_addresses)
+        self.domains = frozenset(domains)
 
         logger.debug("FilterFrom: {} {} {}", mode, self.addresses, self.domains)
 
     def is_in_list(self, addr: str) -> bool:
-        _, domain = addr.split("@", 1)
-        in_list = domain in self.domains or addr in self.addresses
-        return in_list
+        addr = addr.lower()
+        return addr in self.addresses or addr.rpartition("@")[2] in self.domains
 
     def check(self, email: IMAPMessage) -> RuleResult:
         sender = email.addr_from.email
@@ -244,24 +251,23 @@ class RateLimitRule(RateLimiter, Rule):
         self.name = name
         super().__init__(duration, limit)
 
-    def _reset(self, now: datetime.datetime) -> None:
+    def _reset(self, now: int) -> None:
         super()._reset(now)
         logger.trace(
-            "rate limit reset {} {}/{} {}",
+            "rate limit reset {} {}/{} for {}",
             self.name,
             self._limit_count,
             self.limit,
-            self._limit_expiry,
+            self.duration,
         )
 
     def count(self) -> LimitResult:
         res = super().count()
         logger.trace(
-            "rate limit {} {}/{} until {}",
+            "rate limit {} {}/{}",
             self.name,
             self._limit_count,
             self.limit,
-            self._limit_expiry,
         )
         return res
 
@@ -278,42 +284,63 @@ class RateLimitRule(RateLimiter, Rule):
 class RateLimitPerSenderRule(Rule):
     """
     Per-sender rate limit check.
+
+    At most max_entries senders are tracked; when full, the sender whose window
+    started first is forgotten, so a flood of distinct senders can't use up memory.
     """
 
-    def __init__(self, duration: datetime.timedelta, limit: int, name: str = ""):
-        self.rate_limits: dict[str, RateLimitRule] = {}
+    def __init__(
+        self,
+        duration: datetime.timedelta,
+        limit: int,
+        name: str = "",
+        max_entries: int = 10000,
+    ):
+        # Maps each key to [count, window expiry in monotonic ns]; kept in order of
+        # window start: all windows have the same duration, so they also expire in
+        # this order
+        self.rate_limits: OrderedDict[str, list[int]] = OrderedDict()
         self.duration = duration
         self.limit = limit
-        self._next_purge = datetime.datetime.now() + self.duration
+        self.max_entries = max_entries
+        self._duration_ns = duration // datetime.timedelta(microseconds=1) * 1000
+        self._next_purge = time.monotonic_ns() + self._duration_ns
         self.name = name
 
-    def _purge(self, now: datetime.datetime) -> None:
-        for key, rate_limit in self.rate_limits.items():
-            if rate_limit._is_expired(now):
-                del self.rate_limits[key]
+    def _purge(self, now: int) -> None:
+        # Only expired entries are visited
+        while self.rate_limits and now > next(iter(self.rate_limits.values()))[1]:
+            self.rate_limits.popitem(last=False)
 
     def _increase_and_check(self, key: str) -> RuleResult:
-        now = datetime.datetime.now()
-
-        if key in self.rate_limits:
-            if self.rate_limits[key]._is_expired(now):
-                self.rate_limits[key]._reset(now)
-        else:
-            self.rate_limits[key] = RateLimitRule(self.duration, self.limit, f"{self.name}/{key}")
+        now = time.monotonic_ns()
+
+        entry = self.rate_limits.get(key)
+        if entry is None or now > entry[1]:
+            if entry is None and len(self.rate_limits) >= self.max_entries:
+                self._purge(now)
+                if len(self.rate_limits) >= self.max_entries:
+                    self.rate_limits.popitem(last=False)
+            entry = [0, now + self._duration_ns]
+            self.rate_limits[key] = entry
+            self.rate_limits.move_to_end(key)
+        entry[0] += 1
 
         if now > self._next_purge:
             self._purge(now)
-            self._next_purge = now + self.duration
+            self._next_purge = now + self._duration_ns
 
-        return self.rate_limits[key]._check()
+        if entry[0] > self.limit:
+            return RuleResult(Action.BLOCK, f"rate limit {self.name}/{key} exceeded")
+        return RuleResult(Action.ALLOW, None)
 
     def check(self, email: IMAPMessage) -> RuleResult:
-        return self._increase_and_check(email.addr_from.email)
+        return self._increase_and_check(email.addr_from.email.lower())
 
 
 class RateLimitPerDomainRule(RateLimitPerSenderRule):
     def check(self, email: IMAPMessage) -> RuleResult:
-        _, domain = email.addr_from.email.split("@", 1)
+        domain = email.addr_from.email.lower().rpartition("@")[2]
         return self._increase_and_check(domain)
 
 
@@ -330,12 +357,14 @@ class SecurityFilter:
         for check in self.rules:
             result, reason = check.check(email)
             if result == Action.BLOCK:
-                logger.log("SECURITY", "BLOCKED - {} - {}", reason, email.summary())
+                logger.log(LogLevel.SECURITY, "BLOCKED - {} - {}", reason, email.summary())
                 return Action.BLOCK
         return Action.ALLOW
 
 
 def make_security_filter(config: SecurityConfig, name_prefix: str = "") -> SecurityFilter | None:
+    # Rules run in order until one blocks; cheaper rules come first. Rate limits come
+    # last, so that emails blocked by other rules don't use up the quota.
     rules = []
 
     if not config.allow_from and config.allow_from_all_i_want_to_spend_it_all:
@@ -356,6 +385,13 @@ def make_security_filter(config: SecurityConfig, name_prefix: str = "") -> Secur
     elif config.verify_x_mail_from == VerifyMode.ALWAYS:
         rules.append(VerifyXMailFrom(strict=True))
 
+    for fheader in config.filter_headers or []:
+        if fheader.verify == VerifyMode.IF_PRESENT:
+            rules.append(FilterHeader(fheader.header, fheader.values, fheader.mode, False))
+        elif fheader.verify == VerifyMode.ALWAYS:
+            rules.append(FilterHeader(fheader.header, fheader.values, fheader.mode, True))
+
+    # DKIM verification may do DNS lookups, so it runs after the cheap checks
     if config.verify_dkim == VerifyMode.IF_PRESENT:
         assert VerifyDKIM is not None, (
             "dkim extras not installed, VerifyDKIM option is not available"
@@ -367,12 +403,6 @@ def make_security_filter(config: SecurityConfig, name_prefix: str = "") -> Secur
         )
         rules.append(VerifyDKIM(strict=True))
 
-    for fheader in config.filter_headers or []:
-        if fheader.verify == VerifyMode.IF_PRESENT:
-            rules.append(FilterHeader(fheader.header, fheader.values, fheader.mode, False))
-        elif fheader.verify == VerifyMode.ALWAYS:
-            rules.append(FilterHeader(fheader.header, fheader.values, fheader.mode, True))
-
     if config.rate_limit_per_sender and config.rate_limit_per_sender.limit is not None:
         rules.append(
             RateLimitPerSenderRule(
@@ -56,7 +56,8 @@ Although you should probably just use asyncio.Task, this module adds a couple of
   It lets the current Task.run() call finish before cancelling. For some tasks it makes it
   easier to reason about the task's lifecycle, compared to cancel(), which can
   raise CancelledError anywhere await is used. However stop() is not guaranteed
-  to stop a task anytime soon, if it's waiting on I/O that may never come.
+  to stop a task anytime soon, if it's waiting on I/O that may never come,
+  unless the task wraps that wait in Task.unless_stopped.
 
 Beware that due to the Python GIL, running CPU-bound tasks in a ThreadPoolExecutor
 still blocks the entire interpreter. Generally ThreadPoolExecutor is appropriate
@@ -68,27 +69,40 @@ from __future__ import annotations
 
 import abc
 import asyncio
+import functools
+import inspect
+import itertools
 import time
 from collections import defaultdict
 from concurrent.futures import Executor
-from typing import Generic, Self, TypeVar
+from contextvars import ContextVar
+from typing import Awaitable, Generic, Iterator, Self, TypeVar
 
 from loguru import logger
 
-_last_task_id: dict[type, int] = defaultdict(lambda: 0)
+# Per-class task id counters; creating and advancing them runs entirely in C,
+# so it is atomic under the GIL, even when tasks are created from several threads
+_task_ids: defaultdict[type, Iterator[int]] = defaultdict(functools.partial(itertools.count, 1))
 
 
 def get_next_task_id(cls: type) -> int:
-    global _last_task_id
-    _last_task_id[cls] += 1
-    return _last_task_id[cls]
+    return next(_task_ids[cls])
 
 
 def default_task_name(obj: object) -> str:
-    return f"{obj.__class__.__name__}.{get_next_task_id(obj.__class__)}"
+    cls = type(obj)
+    return f"{cls.__name__}.{get_next_task_id(cls)}"
 
 
 T = TypeVar("T")
+R = TypeVar("R")
+
+# Stop signal of the runner executing the current asyncio task; each runner sets it
+# in its own asyncio task, so stopping one runner does not affect other runners
+# of the same Task
+_runner_stop_requested: ContextVar[asyncio.Event | None] = ContextVar(
+    "_runner_stop_requested", default=None
+)
 
 
 class TaskDone(Generic[T]):
@@ -104,6 +118,37 @@ class Task(abc.ABC, Generic[T]):
     def __init__(self, name: str | None = None):
         self._name = name or default_task_name(self)
 
+    async def unless_stopped(self, aw: Awaitable[R]) -> R | None:
+        """
+        Await aw, unless the runner executing the task is stopped first, in which case
+        aw is cancelled (and awaited until it is done cancelling) and None is returned.
+        If the runner was already stopped, aw is cancelled and StoppedError is raised.
+
+        Use this for waits that may block for a long time (e.g. waiting on a queue),
+        so that TaskRunner.stop() takes effect without waiting for them to time out.
+        aw must be safe to cancel: it must not lose anything it already consumed
+        (e.g. AsyncQueue.get puts back a message it takes after being cancelled).
+        """
+        fut = asyncio.ensure_future(aw)
+        stop_requested = _runner_stop_requested.get()
+        if stop_requested is None:
+            # Not running under a TaskRunner, nothing can stop the wait
+            return await fut
+        if stop_requested.is_set():
+            fut.cancel()
+            raise StoppedError()
+        stop_wait = asyncio.ensure_future(stop_requested.wait())
+        try:
+            await asyncio.wait((fut, stop_wait), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            fut.cancel()
+            stop_wait.cancel()
+            # Let aw finish its own cleanup before the caller moves on
+            await asyncio.wait((fut,))
+        if not fut.cancelled():
+            return fut.result()
+        return None
+
     @abc.abstractmethod
     def runner(self, executor: Executor | None = None) -> TaskRunner[T]:
         pass
@@ -121,20 +166,23 @@ class Task(abc.ABC, Generic[T]):
         logger.exception("Exception in task {}", self._name, exc_info=exc)
         raise exc
 
-    def on_stopped(self):
+    def on_stopped(self) -> Awaitable[None] | None:
         """
         Called after the task is stopped.
 
         By default, this method calls on_cancelled().
         """
-        self.on_cancelled()
+        return self.on_cancelled()
 
-    def on_cancelled(self):
+    def on_cancelled(self) -> Awaitable[None] | None:
         """
         Called after the task is cancelled.
 
         It is also called when a task is stopped, unless on_stopped is overridden.
 
+        AsyncTask subclasses may override it with a coroutine function (e.g. to wait
+        for their own subtasks); the runner awaits it before finishing.
+
         By default, this method just logs that the task was cancelled.
         """
         logger.info("Task {} received asyncio.CancelledError", self._name)
@@ -239,6 +287,7 @@ class TaskRunner(abc.ABC, Generic[T]):
         self.cancelled: bool = False
         self.exception: Exception | None = None
         self.waiting_for_interval: bool = False
+        self.stop_requested = asyncio.Event()
 
     @property
     def is_finished(self) -> bool:
@@ -272,6 +321,8 @@ class TaskRunner(abc.ABC, Generic[T]):
                 raise inner_exc from exc
 
     async def _run_until_done(self, interval: float | None = None) -> T:
+        # Runs in its own asyncio task, so this only applies to this runner's Task.run calls
+        _runner_stop_requested.set(self.stop_requested)
         try:
             last_call_t = 0.0
             while True:
@@ -306,10 +357,12 @@ class TaskRunner(abc.ABC, Generic[T]):
         except asyncio.CancelledError as e:
             if e.args and e.args[0] == STOPPED_MESSAGE:
                 self.stopped = True
-                self.task.on_stopped()
+                cleanup = self.task.on_stopped()
             else:
                 self.cancelled = True
-                self.task.on_cancelled()
+                cleanup = self.task.on_cancelled()
+            if inspect.isawaitable(cleanup):
+                await cleanup
             raise
 
     def start(self, interval: float | None = None) -> Self:
@@ -340,6 +393,7 @@ class TaskRunner(abc.ABC, Generic[T]):
 
         logger.info("Stopping task {}", self.name)
         self.stopped = True
+        self.stop_requested.set()
         if self.waiting_for_interval:
             logger.info("Task {} is currently sleeping, cancelling it", self.name)
             self.run_until_done_task.cancel(STOPPED_MESSAGE)
@@ -431,11 +485,17 @@ class SyncTaskExecutorRunner(TaskRunner[T]):
         super().__init__(task)
         self.task = task
         self.executor = executor
+        self.loop: asyncio.AbstractEventLoop | None = None
 
     async def _run_task_async(self) -> TaskDone[T] | None:
         """
         Execute the blocking SyncTask.run method asynchronously by
         using the runner's executor.
+
+        Unlike asyncio.to_thread, loop.run_in_executor does not copy the
+        contextvars context on each call.
         """
-        loop = asyncio.get_running_loop()
-        return await loop.run_in_executor(self.executor, self.task.run)
+        # A runner only runs in the loop it was started in
+        if self.loop is None:
+            self.loop = asyncio.get_running_loop()
+        return await self.loop.run_in_executor(self.executor, self.task.run)
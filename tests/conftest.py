@@ -0,0 +1,12 @@
+from llmailbot.email.model import IMAPRawMessage
+
+
+def make_raw_message(
+    uid: str | None = None,
+    from_addr: str = "user@example.com",
+    headers: dict[str, str] | None = None,
+) -> IMAPRawMessage:
+    lines = [f"From: {from_addr}", "To: bot@example.com", "Subject: Test"]
+    lines.extend(f"{k}: {v}" for k, v in (headers or {}).items())
+    message_data = ("\r\n".join(lines) + "\r\n\r\nHello\r\n").encode()
+    return IMAPRawMessage(message_data=message_data, uid_data=b"", flag_data=[], uid=uid)
@@ -24,6 +24,8 @@ from llmailbot.config import (
     SMTPConfig,
     VerifyMode,
     camel_to_snake_case,
+    default_queue,
+    load_yaml_file,
     snake_to_camel_case,
 )
 from llmailbot.enums import EncryptionMode, QueueType
@@ -64,6 +66,63 @@ def test_camel_to_snake_case():
     assert camel_to_snake_case("ABCDef") == "a_b_c_def"
 
 
+def test_load_yaml_file_cache(tmp_path):
+    path = tmp_path / "config.yaml"
+    path.write_text("Name: first\n")
+    assert load_yaml_file(path) == {"Name": "first"}
+
+    # Returned data is a copy, mutating it does not affect the cache
+    load_yaml_file(path)["Name"] = "mutated"
+    assert load_yaml_file(path) == {"Name": "first"}
+
+    # Changing the file invalidates the cached data
+    path.write_text("Name: second file\n")
+    assert load_yaml_file(path) == {"Name": "second file"}
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("SSL/TLS", EncryptionMode.SSL_TLS),
+        ("StartTLS", EncryptionMode.STARTTLS),
+        ("AllowList", FilterMode.ALLOWLIST),
+        ("Deny List", FilterMode.DENYLIST),
+        ("if  present", VerifyMode.IF_PRESENT),
+    ],
+)
+def test_case_insensitive_enum(value, expected):
+    assert type(expected)(value) is expected
+
+
+def test_case_insensitive_enum_invalid():
+    with pytest.raises(ValueError):
+        EncryptionMode("tls")
+    with pytest.raises(ValueError):
+        QueueType(1)
+
+
+@pytest.mark.parametrize(
+    "config_cls",
+    [
+        SMTPConfig,
+        IMAPConfig,
+        QueueSettings,
+        RateLimitConfig,
+        FilterHeaderConfig,
+        SecurityConfig,
+        ChatModelConfig,
+        ModelSpec,
+        FetchConfig,
+        SendConfig,
+        ReplyConfig,
+    ],
+)
+def test_unique_field_aliases(config_cls):
+    # Settings are case-insensitive, so aliases must be unique regardless of case
+    aliases = [field.alias.lower() for field in config_cls.model_fields.values()]
+    assert len(aliases) == len(set(aliases))
+
+
 class TestSMTPConfig:
     def test_valid_config(self):
         # Test with explicit encryption
@@ -108,6 +167,15 @@ class TestSMTPConfig:
             )
         assert "Cannot infer encryption mode" in str(exc_info.value)
 
+    def test_frozen(self):
+        config = SMTPConfig(
+            username="user@example.com",
+            password=SecretStr("password"),
+            server="smtp.example.com",
+        )
+        with pytest.raises(ValidationError):
+            config.port = 25
+
 
 class TestIMAPConfig:
     def test_valid_config(self):
@@ -168,7 +236,7 @@ class TestQueueSettings:
         # Test memory queue with defaults
         queue = QueueSettings()
         assert queue.queue_type == QueueType.MEMORY
-        assert queue.max_size == 0
+        assert queue.max_size == 1000
         assert queue.timeout == 10
 
         # Test memory queue with custom values
@@ -177,6 +245,10 @@ class TestQueueSettings:
         assert queue.max_size == 100
         assert queue.timeout == 30
 
+    def test_default_queue(self):
+        # Built without validation, must match the validated defaults
+        assert default_queue() == QueueSettings()
+
     def test_redis_queue_settings(self):
         # Test redis queue with minimal settings
         queue = RedisQueueSettings(key="test-queue")
@@ -305,6 +377,13 @@ class TestSecurityConfig:
         assert security.verify_mail_from == VerifyMode.ALWAYS
         assert security.verify_x_mail_from == VerifyMode.IF_PRESENT
 
+    def test_security_config_addresses(self):
+        security = SecurityConfig(allow_from=["User@Example.COM", "*@example.org"])
+        assert security.allow_from == ["User@example.com", "*@example.org"]
+
+        with pytest.raises(ValidationError):
+            SecurityConfig(allow_from=["not an address"])
+
 
 class TestChatModelConfig:
     def test_chat_model_config_defaults(self):
@@ -489,6 +568,16 @@ class TestReplyConfig:
             )
         assert "Each mailbot must use a unique email address" in str(exc_info.value)
 
+    def test_multiple_address_regex_models(self):
+        # Models matched by regex have no address, and don't count as duplicates
+        config = IsolatedReplySettings(
+            models=[
+                ModelSpec(name="Model 1", address_regex=r"bot1\+.*@example\.com"),
+                ModelSpec(name="Model 2", address_regex=r"bot2\+.*@example\.com"),
+            ],
+        )
+        assert len(config.models) == 2
+
 
 # Test-specific subclass of FetchConfig
 class IsolatedFetchSettings(FetchConfig, IsolatedRootSettings):
@@ -0,0 +1,134 @@
+import asyncio
+import time
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from pydantic import SecretStr
+
+from llmailbot.config import IMAPConfig
+from llmailbot.email.fetch import (
+    MAX_HEADER_LENGTH,
+    UID_CHUNK_SIZE,
+    MailboxWatcher,
+    filter_and_enqueue,
+)
+from llmailbot.queue.memory import AsyncioQueue
+from llmailbot.security import Action
+from tests.conftest import make_raw_message
+
+
+@pytest.mark.asyncio
+async def test_filter_and_enqueue_moves_once_per_folder():
+    q = AsyncioQueue()
+    secf = MagicMock()
+    secf.apply.side_effect = [Action.ALLOW, Action.BLOCK, Action.ALLOW]
+    mb = MagicMock()
+    callback = filter_and_enqueue(q, secf, "Replied", "Blocked")
+
+    await callback(mb, [make_raw_message(uid) for uid in ("1", "2", "3")])
+
+    assert (await q.get_nowait()).uid == "1"
+    assert (await q.get_nowait()).uid == "3"
+    assert await q.get_nowait() is None
+    assert mb.move.call_count == 2
+    mb.move.assert_any_call(["1", "3"], "Replied", chunks=UID_CHUNK_SIZE)
+    mb.move.assert_any_call(["2"], "Blocked", chunks=UID_CHUNK_SIZE)
+
+
+@pytest.mark.asyncio
+async def test_filter_and_enqueue_moves_handled_messages_on_error():
+    q = AsyncMock()
+    q.put.side_effect = [None, RuntimeError("queue error")]
+    mb = MagicMock()
+    callback = filter_and_enqueue(q, None, None, "Blocked")
+
+    with pytest.raises(RuntimeError):
+        await callback(mb, [make_raw_message(uid) for uid in ("1", "2")])
+
+    mb.delete.assert_called_once_with(["1"], chunks=UID_CHUNK_SIZE)
+    mb.move.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_filter_and_enqueue_stops_when_queue_full():
+    q = AsyncioQueue(maxsize=1, timeout=0.1)
+    mb = MagicMock()
+    callback = filter_and_enqueue(q, None, "Replied", None)
+
+    await callback(mb, [make_raw_message(uid) for uid in ("1", "2", "3")])
+
+    assert (await q.get_nowait()).uid == "1"
+    assert await q.get_nowait() is None
+    mb.move.assert_called_once_with(["1"], "Replied", chunks=UID_CHUNK_SIZE)
+
+
+@pytest.mark.asyncio
+async def test_filter_and_enqueue_skips_already_enqueued():
+    q = AsyncioQueue()
+    mb = MagicMock()
+    callback = filter_and_enqueue(q, None, "Replied", None)
+
+    await callback(mb, [make_raw_message("1")])
+    # e.g. the previous move failed, and the message was fetched again
+    await callback(mb, [make_raw_message("1"), make_raw_message("2")])
+
+    assert (await q.get_nowait()).uid == "1"
+    assert (await q.get_nowait()).uid == "2"
+    assert await q.get_nowait() is None
+    mb.move.assert_called_with(["1", "2"], "Replied", chunks=UID_CHUNK_SIZE)
+
+
+@pytest.mark.asyncio
+async def test_filter_and_enqueue_blocks_oversized_headers():
+    q = AsyncioQueue()
+    mb = MagicMock()
+    callback = filter_and_enqueue(q, None, "Replied", "Blocked")
+    message = make_raw_message("1")
+    message.message_data = b"X-Stuffed: " + b";" * MAX_HEADER_LENGTH + message.message_data
+
+    await callback(mb, [message])
+
+    assert await q.get_nowait() is None
+    mb.move.assert_called_once_with(["1"], "Blocked", chunks=UID_CHUNK_SIZE)
+
+
+@pytest.fixture
+def watcher(monkeypatch):
+    mb = MagicMock()
+    mb.client.capabilities = ("IMAP4REV1", "IDLE")
+    monkeypatch.setattr("llmailbot.email.fetch.connect_mailbox", lambda *args: mb)
+    config = IMAPConfig(
+        username="user@example.com",
+        password=SecretStr("password"),
+        server="imap.example.com",
+        replied_folder=None,
+        blocked_folder=None,
+        idle_timeout=30,
+    )
+    return MailboxWatcher(config, callback=AsyncMock())
+
+
+@pytest.mark.asyncio
+async def test_idle_returns_server_responses(watcher):
+    idle = watcher.mb.idle.__enter__.return_value
+    idle.poll.side_effect = [[], [b"* 1 EXISTS"]]
+
+    assert await watcher.idle() == [b"* 1 EXISTS"]
+    watcher.mb.idle.__exit__.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_idle_cancel_ends_idle(watcher, monkeypatch):
+    monkeypatch.setattr("llmailbot.email.fetch.IDLE_POLL_INTERVAL", 0.1)
+    idle = watcher.mb.idle.__enter__.return_value
+    idle.poll.side_effect = lambda timeout: time.sleep(timeout) or []
+
+    idle_task = asyncio.create_task(watcher.idle())
+    await asyncio.sleep(0.1)
+    start_t = time.time()
+    idle_task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await idle_task
+
+    assert time.time() - start_t < 0.5
+    watcher.mb.idle.__exit__.assert_called_once()
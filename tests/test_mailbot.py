@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+from llmailbot.config import ModelSpec
+from llmailbot.email.model import IMAPMessage, IMAPRawMessage, SimpleEmailMessage
+from llmailbot.mailbot import BotReplySpawnTask, MailBot, quote_email
+from llmailbot.queue.memory import AsyncioQueue
+from tests.conftest import make_raw_message
+
+
+class SlowMailBot(MailBot):
+    """A mailbot that takes a while to reply, and tracks how many replies overlap."""
+
+    def __init__(self, specs: list[ModelSpec] | None = None, delay: float = 0.05):
+        super().__init__(specs or [])
+        self.delay = delay
+        self.running = 0
+        self.max_running = 0
+        self.replied = 0
+
+    async def compose_reply(self, spec, bot_email, user_email, conversation) -> str:
+        raise NotImplementedError
+
+    async def reply(self, email: IMAPMessage) -> SimpleEmailMessage | None:
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(self.delay)
+        self.running -= 1
+        self.replied += 1
+        return None
+
+
+@pytest.mark.asyncio
+async def test_spawn_task_limits_concurrency():
+    mailbot = SlowMailBot()
+    recvq = AsyncioQueue(timeout=0.1)
+    for _ in range(10):
+        await recvq.put(make_raw_message())
+
+    task = BotReplySpawnTask(mailbot, recvq, AsyncioQueue(), max_concurrency=3)
+    runner = task.runner().start()
+    async with asyncio.timeout(2):
+        while mailbot.replied < 10:
+            await asyncio.sleep(0.01)
+    await runner.shutdown()
+
+    assert mailbot.replied == 10
+    assert mailbot.max_running == 3
+
+
+@pytest.mark.asyncio
+async def test_spawn_task_shutdown_cancels_replies():
+    mailbot = SlowMailBot(delay=10)
+    recvq = AsyncioQueue(timeout=0.1)
+    for _ in range(3):
+        await recvq.put(make_raw_message())
+
+    task = BotReplySpawnTask(mailbot, recvq, AsyncioQueue(), max_concurrency=3)
+    runner = task.runner().start()
+    async with asyncio.timeout(2):
+        while mailbot.running < 3:
+            await asyncio.sleep(0.01)
+        await runner.shutdown()
+
+    assert not task.replies
+    assert mailbot.replied == 0
+
+
+def test_quote_email_truncates():
+    message_data = b"From: User <user@example.com>\r\nTo: bot@example.com\r\n\r\nline1\r\nline2\r\n"
+    email = IMAPRawMessage(message_data=message_data, uid_data=b"", flag_data=[]).parsed()
+
+    assert quote_email(email).endswith("\n\n> line1\n> line2")
+    assert quote_email(email, max_length=3).endswith("\n\n> lin\n> [...]")
+
+
+def test_get_spec_uses_config_order():
+    specs = [
+        ModelSpec(name="exact", address="bot@example.com"),
+        ModelSpec(name="regex", address_regex=r"bot.*@example\.com"),
+        ModelSpec(name="exact2", address="bot2@example.com"),
+    ]
+    mailbot = SlowMailBot(specs)
+
+    assert mailbot._get_spec(["bot@example.com"]) == ("bot@example.com", specs[0])
+    # The regex spec comes before exact2 in the config
+    assert mailbot._get_spec(["bot2@example.com"]) == ("bot2@example.com", specs[1])
+    assert mailbot._get_spec(["other@example.com", "bot3@example.com"]) == (
+        "bot3@example.com",
+        specs[1],
+    )
+    assert mailbot._get_spec(["other@example.com"]) == (None, None)
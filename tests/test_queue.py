@@ -0,0 +1,21 @@
+import asyncio
+
+import pytest
+
+from llmailbot.queue.core import AsyncAdapter
+from llmailbot.queue.memory import MemoryQueue
+
+
+@pytest.mark.asyncio
+async def test_async_adapter_get_puts_back_late_message():
+    q = AsyncAdapter(MemoryQueue(timeout=1.0))
+    get = asyncio.create_task(q.get())
+    await asyncio.sleep(0.05)
+    get.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await get
+
+    # The cancelled get's thread is still blocked, and takes this message
+    await q.put("a")
+    await asyncio.sleep(0.1)
+    assert await q.get_nowait() == "a"
@@ -0,0 +1,93 @@
+import datetime
+import time
+
+import pytest
+
+from llmailbot.email.model import IMAPMessage
+from llmailbot.enums import FilterMode
+from llmailbot.security import (
+    Action,
+    FilterFrom,
+    RateLimitPerDomainRule,
+    RateLimitPerSenderRule,
+    RateLimitRule,
+)
+from tests.conftest import make_raw_message
+
+
+def make_email(from_addr: str) -> IMAPMessage:
+    return make_raw_message(from_addr=from_addr).parsed()
+
+
+class TestFilterFrom:
+    @pytest.mark.parametrize(
+        "sender, expected",
+        [
+            ("user@example.com", Action.ALLOW),
+            ("User@EXAMPLE.com", Action.ALLOW),
+            ("anyone@trusted.org", Action.ALLOW),
+            ("anyone@sub.trusted.org", Action.BLOCK),
+            ("other@example.com", Action.BLOCK),
+        ],
+    )
+    def test_allowlist(self, sender, expected):
+        rule = FilterFrom(FilterMode.ALLOWLIST, ["user@example.com", "*@Trusted.org"])
+        assert rule.check(make_email(sender)).action == expected
+
+    def test_denylist(self):
+        rule = FilterFrom(FilterMode.DENYLIST, ["spammer@example.com", "*@spam.net"])
+        assert rule.check(make_email("Spammer@example.com")).action == Action.BLOCK
+        assert rule.check(make_email("someone@spam.net")).action == Action.BLOCK
+        assert rule.check(make_email("user@example.com")).action == Action.ALLOW
+
+
+class TestRateLimit:
+    def test_limit_exceeded(self):
+        rule = RateLimitRule(datetime.timedelta(hours=1), 2)
+        email = make_email("user@example.com")
+        assert rule.check(email).action == Action.ALLOW
+        assert rule.check(email).action == Action.ALLOW
+        assert rule.check(email).action == Action.BLOCK
+
+    def test_window_expiry(self):
+        rule = RateLimitRule(datetime.timedelta(milliseconds=10), 1)
+        email = make_email("user@example.com")
+        assert rule.check(email).action == Action.ALLOW
+        assert rule.check(email).action == Action.BLOCK
+        time.sleep(0.02)
+        assert rule.check(email).action == Action.ALLOW
+
+    def test_per_sender_purges_expired(self):
+        rule = RateLimitPerSenderRule(datetime.timedelta(milliseconds=10), 1)
+        assert rule.check(make_email("a@example.com")).action == Action.ALLOW
+        assert rule.check(make_email("b@example.com")).action == Action.ALLOW
+        assert rule.check(make_email("a@example.com")).action == Action.BLOCK
+        time.sleep(0.02)
+        assert rule.check(make_email("c@example.com")).action == Action.ALLOW
+        assert set(rule.rate_limits) == {"c@example.com"}
+
+    def test_per_sender_purge_keeps_renewed(self):
+        rule = RateLimitPerSenderRule(datetime.timedelta(milliseconds=10), 1)
+        assert rule.check(make_email("a@example.com")).action == Action.ALLOW
+        assert rule.check(make_email("b@example.com")).action == Action.ALLOW
+        time.sleep(0.02)
+        # a's window restarts, so only b is purged
+        assert rule.check(make_email("a@example.com")).action == Action.ALLOW
+        assert list(rule.rate_limits) == ["a@example.com"]
+        assert rule.check(make_email("a@example.com")).action == Action.BLOCK
+
+    def test_per_sender_max_entries(self):
+        rule = RateLimitPerSenderRule(datetime.timedelta(hours=1), 1, max_entries=2)
+        for sender in ("a@example.com", "b@example.com", "c@example.com"):
+            assert rule.check(make_email(sender)).action == Action.ALLOW
+        assert list(rule.rate_limits) == ["b@example.com", "c@example.com"]
+
+    def test_per_sender_ignores_case(self):
+        rule = RateLimitPerSenderRule(datetime.timedelta(hours=1), 1)
+        assert rule.check(make_email("user@example.com")).action == Action.ALLOW
+        assert rule.check(make_email("User@Example.COM")).action == Action.BLOCK
+
+    def test_per_domain_ignores_case(self):
+        rule = RateLimitPerDomainRule(datetime.timedelta(hours=1), 1)
+        assert rule.check(make_email("a@example.com")).action == Action.ALLOW
+        assert rule.check(make_email("b@EXAMPLE.com")).action == Action.BLOCK
@@ -0,0 +1,120 @@
+import datetime
+from smtplib import SMTPAuthenticationError, SMTPRecipientsRefused
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from imap_tools.utils import EmailAddress
+from pydantic import SecretStr
+
+from llmailbot.config import SMTPConfig
+from llmailbot.email.model import SimpleEmailMessage
+from llmailbot.email.send import (
+    MailSender,
+    SendMailTask,
+    SMTPSender,
+    StdoutFakeMailSender,
+    connect_smtp,
+)
+from llmailbot.queue.memory import AsyncioQueue
+
+
+# SMTPConfig is frozen, so one instance can be shared by all tests in the module
+@pytest.fixture(scope="module")
+def smtp_config():
+    return SMTPConfig(
+        username="user@example.com",
+        password=SecretStr("password"),
+        server="smtp.example.com",
+        port=587,
+    )
+
+
+def test_connect_smtp_starttls(monkeypatch, smtp_config):
+    client = MagicMock()
+    monkeypatch.setattr("llmailbot.email.send.SMTP", lambda **kwargs: client)
+
+    assert connect_smtp(smtp_config) is client
+    client.starttls.assert_called_once()
+    client.login.assert_called_once_with("user@example.com", "password")
+    client.close.assert_not_called()
+
+
+def test_connect_smtp_closes_on_login_error(monkeypatch, smtp_config):
+    client = MagicMock()
+    client.login.side_effect = SMTPAuthenticationError(535, b"Authentication failed")
+    monkeypatch.setattr("llmailbot.email.send.SMTP", lambda **kwargs: client)
+
+    with pytest.raises(SMTPAuthenticationError):
+        connect_smtp(smtp_config)
+    client.close.assert_called_once()
+
+
+def test_smtp_sender_continues_after_failed_email(monkeypatch, smtp_config):
+    client = MagicMock()
+    client.send_message.side_effect = [None, SMTPRecipientsRefused({}), None]
+    monkeypatch.setattr("llmailbot.email.send.connect_smtp", lambda config: client)
+
+    emails = [
+        SimpleEmailMessage(
+            addr_from=EmailAddress("Bot", "bot@example.com"),
+            addrs_to=(EmailAddress("", f"{name}@example.com"),),
+            subject="Hello",
+            body="Hello",
+            date=datetime.datetime.now(datetime.timezone.utc),
+        )
+        for name in ("a", "b", "c")
+    ]
+    SMTPSender(smtp_config).send(emails)
+
+    sent_to = [call.kwargs["to_addrs"] for call in client.send_message.call_args_list]
+    assert sent_to == [["a@example.com"], ["b@example.com"], ["c@example.com"]]
+    client.quit.assert_called_once()
+
+
+class FlakyMailSender(MailSender):
+    """A sender that fails to connect a given number of times before sending."""
+
+    def __init__(self, smtp_config, failures: int):
+        super().__init__(smtp_config)
+        self.failures = failures
+        self.sent = []
+
+    def send(self, emails):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionRefusedError()
+        self.sent.extend(emails)
+
+
+@pytest.mark.asyncio
+async def test_send_task_retries_batch(monkeypatch, smtp_config):
+    monkeypatch.setattr("llmailbot.email.send.MAX_RETRY_DELAY", 0)
+    q = AsyncioQueue()
+    sender = FlakyMailSender(smtp_config, failures=2)
+    task = SendMailTask(sender, q, batch_size=2, retries=2)
+    for email in ("a", "b"):
+        await q.put(email)
+
+    await task.run()
+    assert sender.sent == ["a", "b"]
+
+
+@pytest.mark.asyncio
+async def test_drain_batch(smtp_config):
+    q = AsyncioQueue()
+    task = SendMailTask(StdoutFakeMailSender(smtp_config), q, batch_size=2)
+    for email in ("a", "b", "c"):
+        await q.put(email)
+
+    assert await task.drain_batch() == ["a", "b"]
+    assert await task.drain_batch() == ["c"]
+
+
+@pytest.mark.asyncio
+async def test_drain_batch_keeps_email_if_bulk_get_fails(monkeypatch, smtp_config):
+    q = AsyncioQueue()
+    task = SendMailTask(StdoutFakeMailSender(smtp_config), q, batch_size=2)
+    monkeypatch.setattr(q, "get_many_nowait", AsyncMock(side_effect=ConnectionError))
+    await q.put("a")
+
+    assert await task.drain_batch() == ["a"]
@@ -128,6 +128,69 @@ async def test_task_stop():
     assert task.run_count == initial_count
 
 
+class QueueWaitTask(AsyncTask[None]):
+    """A task that waits on a queue, interruptible by stop()."""
+
+    def __init__(self, name: str | None = None):
+        super().__init__(name=name)
+        self.queue: asyncio.Queue[int] = asyncio.Queue()
+        self.received: list[int | None] = []
+
+    async def run(self) -> TaskDone[None] | None:
+        self.received.append(await self.unless_stopped(self.queue.get()))
+
+
+@pytest.mark.asyncio
+async def test_task_stop_interrupts_wait():
+    """Test that stop() interrupts a wait wrapped in unless_stopped."""
+    task = QueueWaitTask()
+    runner = task.runner()
+    runner.start()
+
+    task.queue.put_nowait(1)
+    await asyncio.sleep(0.1)
+    assert task.received == [1]
+
+    # The task is now blocked on an empty queue
+    start_t = time.time()
+    runner.stop()
+    with pytest.raises(StoppedError):
+        await runner.result()
+
+    assert time.time() - start_t < 0.5
+    assert task.received == [1, None]
+    # The cancelled get must not have consumed anything
+    task.queue.put_nowait(2)
+    assert task.queue.get_nowait() == 2
+
+
+@pytest.mark.asyncio
+async def test_task_stop_one_of_multiple_runners():
+    """Test that stopping one runner does not stop other runners of the same task."""
+    task = QueueWaitTask()
+    runner1 = task.runner()
+    runner2 = task.runner()
+    runner1.start()
+    runner2.start()
+    await asyncio.sleep(0.1)
+
+    runner1.stop()
+    with pytest.raises(StoppedError):
+        await runner1.result()
+    assert task.received == [None]
+
+    # runner2 keeps waiting on the queue, rather than spinning
+    await asyncio.sleep(0.1)
+    assert task.received == [None]
+    task.queue.put_nowait(1)
+    await asyncio.sleep(0.1)
+    assert task.received == [None, 1]
+    assert not runner2.is_finished
+
+    await runner2.shutdown()
+    assert runner2.stopped
+
+
 @pytest.mark.asyncio
 async def test_task_cancel():
     """Test that cancelling a task interrupts it immediately."""